@@ -1,3 +1,10 @@
+from app.cache import MemoryCache
+from app.fragments import FragmentCache
+from app.images import ImageCache
+from app.instrumentation import Instrumentation
+from app.mal import MALClient
+from app.ratelimit import SearchLimiter
+from app.suggest import TitleIndex
 from config import Config
 from flask import Flask
 from flask_bootstrap import Bootstrap
@@ -11,6 +18,12 @@ login = LoginManager()
 login.login_view = 'auth.login'
 login.login_message = 'Please log in to access this page.'
 bootstrap = Bootstrap()
+mal = MALClient()
+search_limiter = SearchLimiter()
+suggestions = TitleIndex()
+fragments = FragmentCache()
+images = ImageCache()
+instrumentation = Instrumentation()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -20,6 +33,13 @@ def create_app(config_class=Config):
     migrate.init_app(app, db)
     login.init_app(app)
     bootstrap.init_app(app)
+    mal.init_app(app)
+    search_limiter.init_app(app)
+    app.extensions['user_cache'] = MemoryCache(app.config['USER_CACHE_SIZE'])
+    suggestions.init_app(app)
+    fragments.init_app(app)
+    images.init_app(app)
+    instrumentation.init_app(app)
 
     from app.errors import bp as errors_bp
     app.register_blueprint(errors_bp)
@@ -30,6 +50,9 @@ def create_app(config_class=Config):
     from app.main import bp as main_bp
     app.register_blueprint(main_bp)
 
+    from app.api import bp as api_bp
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+
     return app
 
 from app import models
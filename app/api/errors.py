@@ -0,0 +1,23 @@
+from app.api import bp
+from flask import jsonify
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import HTTP_STATUS_CODES
+
+
+def error_response(status_code, message=None, **kwargs):
+    payload = {'error': HTTP_STATUS_CODES.get(status_code, 'Unknown error')}
+    if message:
+        payload['message'] = message
+    payload.update(kwargs)
+    response = jsonify(payload)
+    response.status_code = status_code
+    return response
+
+
+def bad_request(message, **kwargs):
+    return error_response(400, message, **kwargs)
+
+
+@bp.errorhandler(HTTPException)
+def http_error(error):
+    return error_response(error.code)
@@ -0,0 +1,110 @@
+from app import db
+from app.api import bp
+from app.api.errors import bad_request, error_response
+from app.models import STATUSES, Tracker, UserStats, validate_progress
+from app.pagination import paginate_keyset
+from datetime import datetime
+from flask import current_app, jsonify, request, url_for
+from flask_login import current_user
+from sqlalchemy.orm import joinedload
+
+
+@bp.before_request
+def require_login():
+    '''Rejects API requests from anonymous users instead of redirecting to the login page.'''
+    if not current_user.is_authenticated:
+        return error_response(401)
+
+
+def conditional(payload):
+    '''Returns the payload as JSON with an ETag, or a 304 if the client already has it.'''
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@bp.route('/trackers', methods=['GET'])
+def get_trackers():
+    '''Returns a page of the current user's trackers in most recently updated order.'''
+    status = request.args.get('status', type=str)
+    cursor = request.args.get('cursor', type=str)
+    per_page = max(1, min(request.args.get('per_page', current_app.config['TRACKERS_PER_PAGE'],
+        type=int), 100))
+    trackers = current_user.trackers.options(joinedload(Tracker.anime))
+    if status:
+        trackers = trackers.filter_by(status=status)
+    page = paginate_keyset(trackers, (Tracker.timestamp, Tracker.id), cursor, per_page)
+    return conditional({
+        'items': [tracker.to_dict() for tracker in page.items],
+        '_links': {
+            'self': url_for('api.get_trackers', status=status, cursor=cursor, per_page=per_page),
+            'next': url_for('api.get_trackers', status=status, cursor=page.next_cursor,
+                per_page=per_page) if page.has_next else None,
+            'prev': url_for('api.get_trackers', status=status, cursor=page.prev_cursor,
+                per_page=per_page) if page.has_prev else None
+        }
+    })
+
+
+@bp.route('/trackers/<int:tracker_id>', methods=['GET'])
+def get_tracker(tracker_id):
+    '''Returns a single tracker of the current user.'''
+    tracker = current_user.trackers.options(joinedload(Tracker.anime)) \
+        .filter_by(id=tracker_id).first_or_404()
+    return conditional(tracker.to_dict())
+
+
+@bp.route('/trackers', methods=['PATCH'])
+def update_trackers():
+    '''Applies a batch of {tracker_id, watched_episodes, status} updates to the current
+    user's trackers in a single transaction. Every update is validated with the same
+    rules as the tracker form, and nothing is applied if any of them is invalid.'''
+    data = request.get_json(silent=True)
+    updates = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(updates, list) or not updates:
+        return bad_request('Expected a non-empty list of updates.')
+    if len(updates) > current_app.config['API_MAX_BATCH']:
+        return bad_request(f'At most {current_app.config["API_MAX_BATCH"]} updates are allowed.')
+    # Booleans are ints too, so compare the type itself
+    if not all(isinstance(update, dict) and type(update.get('tracker_id')) is int
+            for update in updates):
+        return bad_request('Every update must have an integer tracker_id.')
+    ids = [update['tracker_id'] for update in updates]
+    trackers = {tracker.id: tracker for tracker in current_user.trackers
+        .options(joinedload(Tracker.anime)).filter(Tracker.id.in_(ids))}
+    errors = {}
+    changes = []
+    for update in updates:
+        tracker = trackers.get(update['tracker_id'])
+        watched_episodes = update.get('watched_episodes', tracker and tracker.watched_episodes)
+        status = update.get('status', tracker and tracker.status)
+        if tracker is None:
+            error = 'Tracker not found.'
+        elif type(watched_episodes) is not int:
+            error = 'Watched episodes must be an integer.'
+        elif status not in STATUSES:
+            error = f'Status must be one of {", ".join(STATUSES)}.'
+        else:
+            error = validate_progress(tracker.anime, watched_episodes,
+                tracker.start_date, tracker.end_date)
+        if error is not None:
+            errors[str(update['tracker_id'])] = error
+            continue
+        changes.append(((tracker.status, tracker.watched_episodes), (status, watched_episodes)))
+        tracker.watched_episodes = watched_episodes
+        tracker.status = status
+        tracker.timestamp = datetime.utcnow()
+    if errors:
+        db.session.rollback()
+        return bad_request('Some updates are invalid.', errors=errors)
+    # Serialize before committing, which would expire every tracker in the batch
+    items = [trackers[id].to_dict() for id in dict.fromkeys(ids)]
+    UserStats.adjust(current_user.id, changes)
+    db.session.commit()
+    return jsonify({'items': items})
+
+
+@bp.route('/stats', methods=['GET'])
+def get_stats():
+    '''Returns the tracker statistics of the current user.'''
+    return conditional(UserStats.for_user(current_user.id).to_dict())
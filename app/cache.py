@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class Cache(object):
+    '''Base class for the key/value caches. Keys are strings and every entry carries
+    its own time to live. Backends are bounded to maxsize entries and evict the least
+    recently used ones first.'''
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+
+    def _record(self, hits=0, misses=0, evictions=0):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+            self.evictions += evictions
+
+    def stats(self):
+        '''Returns the hits, misses and evictions of this process since the cache was made.'''
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def contains(self, key):
+        '''Returns whether the key has an unexpired entry, without counting it as a
+        lookup or marking the entry as used.'''
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+
+class NullCache(Cache):
+    '''Cache that never stores anything.'''
+
+    def get(self, key):
+        self._record(misses=1)
+        return None
+
+    def contains(self, key):
+        return False
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+
+class MemoryCache(Cache):
+    '''In-process LRU cache. Values are stored as is, so callers must not mutate them.'''
+
+    def __init__(self, maxsize):
+        super(MemoryCache, self).__init__(maxsize)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._record(misses=1)
+                return None
+            self._entries.move_to_end(key)
+        self._record(hits=1)
+        return entry[1]
+
+    def contains(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def set(self, key, value, ttl):
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+        self._record(evictions=evicted)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(Cache):
+    '''On-disk cache in a SQLite file, shared by every process on the host. Values
+    must be JSON serializable.'''
+
+    def __init__(self, maxsize, path):
+        super(SQLiteCache, self).__init__(maxsize)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, '
+                'value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_cache_accessed_at '
+                'ON cache (accessed_at)')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute('SELECT value, expires_at FROM cache WHERE key = ?',
+            (key,)).fetchone()
+        if row is None or row[1] < now:
+            if row is not None:
+                connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self._record(misses=1)
+            return None
+        connection.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+        self._record(hits=1)
+        return json.loads(row[0])
+
+    def contains(self, key):
+        return self._connect().execute('SELECT 1 FROM cache WHERE key = ? AND expires_at >= ?',
+            (key, time.time())).fetchone() is not None
+
+    def set(self, key, value, ttl):
+        connection = self._connect()
+        now = time.time()
+        connection.execute('INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) '
+            'VALUES (?, ?, ?, ?)', (key, json.dumps(value), now + ttl, now))
+        excess = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0] - self.maxsize
+        if excess > 0:
+            cursor = connection.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed_at LIMIT ?)', (excess,))
+            self._record(evictions=cursor.rowcount)
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+
+class RedisCache(Cache):
+    '''Cache in a Redis-compatible server, shared by every process and host. Entries
+    expire through Redis TTLs, while a sorted set of access times enforces the LRU
+    bound. Values must be JSON serializable.'''
+
+    def __init__(self, maxsize, url, prefix='animetracker:'):
+        super(RedisCache, self).__init__(maxsize)
+        if redis is None:
+            raise RuntimeError('The redis package is required for the redis cache backend.')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.lru_key = f'{prefix}lru'
+
+    def get(self, key):
+        key = self.prefix + key
+        value = self.client.get(key)
+        if value is None:
+            self.client.zrem(self.lru_key, key)
+            self._record(misses=1)
+            return None
+        self.client.zadd(self.lru_key, {key: time.time()})
+        self._record(hits=1)
+        return json.loads(value)
+
+    def contains(self, key):
+        return bool(self.client.exists(self.prefix + key))
+
+    def set(self, key, value, ttl):
+        key = self.prefix + key
+        pipeline = self.client.pipeline()
+        pipeline.set(key, json.dumps(value), ex=max(int(ttl), 1))
+        pipeline.zadd(self.lru_key, {key: time.time()})
+        pipeline.zcard(self.lru_key)
+        size = pipeline.execute()[-1]
+        if size > self.maxsize:
+            evicted = [key for key, _ in self.client.zpopmin(self.lru_key, size - self.maxsize)]
+            if evicted:
+                self.client.delete(*evicted)
+            self._record(evictions=len(evicted))
+
+    def delete(self, key):
+        key = self.prefix + key
+        self.client.delete(key)
+        self.client.zrem(self.lru_key, key)
+
+
+def make_cache(backend, maxsize, url=None):
+    '''Returns a cache for the configured backend: memory, sqlite, redis or none.'''
+    if backend == 'memory':
+        return MemoryCache(maxsize)
+    if backend == 'sqlite':
+        return SQLiteCache(maxsize, url or 'cache.db')
+    if backend == 'redis':
+        return RedisCache(maxsize, url or 'redis://localhost:6379/0')
+    if backend in (None, '', 'none'):
+        return NullCache(maxsize)
+    raise ValueError(f'Unknown cache backend: {backend}')
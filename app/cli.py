@@ -0,0 +1,67 @@
+import click
+
+from app import db
+from app.jobs import work
+from app.models import User, UserStats
+from app.transfer import export_csv, export_json, import_trackers, iter_csv, iter_mal_xml
+
+
+def register(app):
+    @app.cli.group()
+    def trackers():
+        '''Tracker list import and export commands.'''
+        pass
+
+    @trackers.command('import')
+    @click.argument('username')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    def import_command(username, path):
+        '''Import a MyAnimeList XML export or a CSV file into a user's trackers.'''
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f'No user named {username}.')
+        with open(path, 'rb') as stream:
+            rows = iter_mal_xml(stream) if path.lower().endswith('.xml') else iter_csv(stream)
+            imported, skipped = import_trackers(user.id, rows)
+        click.echo(f'Imported {imported} trackers, skipped {skipped} entries.')
+
+    @trackers.command('export')
+    @click.argument('username')
+    @click.option('--format', type=click.Choice(['csv', 'json']), default='csv')
+    @click.option('--output', type=click.File('w'), default='-')
+    def export_command(username, format, output):
+        '''Export a user's trackers as CSV or JSON.'''
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f'No user named {username}.')
+        for chunk in (export_csv if format == 'csv' else export_json)(user.id):
+            output.write(chunk)
+
+    @app.cli.command()
+    @click.option('--once', is_flag=True, help='Exit once the queue is empty.')
+    def worker(once):
+        '''Run background jobs such as fetching missing anime details.'''
+        work(once=once)
+
+    @app.cli.group()
+    def catalog():
+        '''Anime catalog maintenance commands.'''
+        pass
+
+    @catalog.command()
+    def refresh():
+        '''Enqueue a refresh of the stalest airing or incomplete tracked animes.'''
+        from app.tasks import refresh_catalog
+        click.echo(f'Enqueued refreshes for {refresh_catalog()} animes.')
+
+    @app.cli.group()
+    def stats():
+        '''User statistics maintenance commands.'''
+        pass
+
+    @stats.command()
+    def rebuild():
+        '''Recompute the statistics of every user from their trackers.'''
+        UserStats.rebuild()
+        db.session.commit()
+        click.echo(f'Rebuilt statistics for {UserStats.query.count()} users.')
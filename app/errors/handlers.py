@@ -1,4 +1,4 @@
-from flask import render_template
+from flask import make_response, render_template
 from app import db
 from app.errors import bp
 
@@ -11,4 +11,12 @@ def not_found_error(error):
 @bp.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
-    return render_template('errors/500.html'), 500
\ No newline at end of file
+    return render_template('errors/500.html'), 500
+
+
+@bp.app_errorhandler(429)
+def too_many_requests_error(error):
+    response = make_response(render_template('errors/429.html', retry_after=error.retry_after), 429)
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
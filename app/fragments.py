@@ -0,0 +1,32 @@
+from app.cache import MemoryCache, NullCache
+from flask import current_app
+from markupsafe import Markup
+
+
+class FragmentCache(object):
+    '''Caches rendered template fragments for an anime that are the same for every user,
+    such as its image and title cells. Fragments are keyed by the anime id and version,
+    so an anime whose row changes simply misses and the stale entry ages out of the LRU.'''
+
+    def __init__(self, app=None):
+        self.cache = NullCache(0)
+        self.ttl = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        size = app.config['FRAGMENT_CACHE_SIZE']
+        self.cache = MemoryCache(size) if size > 0 else NullCache(0)
+        self.ttl = app.config['FRAGMENT_CACHE_TTL']
+        app.extensions['fragments'] = self
+        app.add_template_global(self.render, 'cached_fragment')
+
+    def render(self, template, anime):
+        '''Returns the template rendered for the anime, from the cache when possible.'''
+        key = f'{template}:{anime.id}:{anime.version}'
+        fragment = self.cache.get(key)
+        if fragment is None:
+            # The fragment only sees the anime, so nothing user specific can leak into it
+            fragment = Markup(current_app.jinja_env.get_template(template).render(anime=anime))
+            self.cache.set(key, fragment, self.ttl)
+        return fragment
@@ -0,0 +1,128 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+import requests
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageCache(object):
+    '''Disk cache of resized cover art. Thumbnails are stored once under the hash of their
+    content in objects/, and refs/ maps the hash of each source url to its thumbnail, so
+    animes sharing an image share the file. Once the objects outgrow max_bytes, the least
+    recently served ones are deleted first. Images are resized with Pillow when it is
+    installed and stored as they are otherwise.'''
+
+    def __init__(self):
+        self.root = None
+        self.max_bytes = 0
+        self.width = 0
+        self.timeout = None
+        self.size = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.root = app.config['IMAGE_CACHE_DIR']
+        self.max_bytes = app.config['IMAGE_CACHE_MAX_BYTES']
+        self.width = app.config['IMAGE_THUMBNAIL_WIDTH']
+        self.timeout = (app.config['MAL_CONNECT_TIMEOUT'], app.config['MAL_REQUEST_TIMEOUT'])
+        app.extensions['images'] = self
+
+    def _path(self, kind, digest):
+        return os.path.join(self.root, kind, digest[:2], digest)
+
+    def _write(self, path, data):
+        '''Writes a file atomically, so that a reader never sees it half written.'''
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+            f.write(data)
+        os.replace(f.name, path)
+
+    def lookup(self, url):
+        '''Returns the path, digest and mimetype of the cached thumbnail of an image url,
+        or None if it has not been fetched or has been evicted.'''
+        try:
+            with open(self._path('refs', sha256(url.encode()))) as f:
+                digest, mimetype = f.read().split()
+            path = self._path('objects', digest)
+            # Mark the thumbnail as recently served for the eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return path, digest, mimetype
+
+    def thumbnail(self, data, mimetype):
+        '''Shrinks an image to the thumbnail width, or returns it unchanged if it cannot be.'''
+        if Image is None:
+            return data, mimetype
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.thumbnail((self.width, self.width * 2))
+            buffer = io.BytesIO()
+            image.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+        except (OSError, ValueError):
+            return data, mimetype
+        return buffer.getvalue(), 'image/jpeg'
+
+    def fetch(self, url):
+        '''Downloads an image and caches its thumbnail. Returns the same as lookup, or None
+        if the image cannot be downloaded.'''
+        try:
+            response = requests.get(url, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            return None
+        mimetype = response.headers.get('Content-Type', '').split(';')[0].strip()
+        if response.status_code != 200 or not mimetype.startswith('image/'):
+            return None
+        data, mimetype = self.thumbnail(response.content, mimetype)
+        digest = sha256(data)
+        path = self._path('objects', digest)
+        if not os.path.exists(path):
+            self._write(path, data)
+            self._grow(len(data))
+        self._write(self._path('refs', sha256(url.encode())), f'{digest} {mimetype}'.encode())
+        return path, digest, mimetype
+
+    def get(self, url):
+        return self.lookup(url) or self.fetch(url)
+
+    def _objects(self):
+        for directory in os.scandir(os.path.join(self.root, 'objects')):
+            if directory.is_dir():
+                for entry in os.scandir(directory.path):
+                    if entry.is_file():
+                        yield entry
+
+    def _grow(self, size):
+        '''Accounts for a new thumbnail, evicting the least recently served ones if the
+        cache is over its size. Eviction goes down to 90% of the size so that it does not
+        run on every new thumbnail.'''
+        with self._lock:
+            if self.size is None:
+                self.size = sum(entry.stat().st_size for entry in self._objects())
+            else:
+                self.size += size
+            if self.size <= self.max_bytes:
+                return
+            # Other processes share the directory, so recount before evicting
+            entries = sorted((stat.st_mtime, stat.st_size, entry.path)
+                for entry in self._objects() for stat in [entry.stat()])
+            self.size = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if self.size <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self.size -= size
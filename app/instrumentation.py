@@ -0,0 +1,294 @@
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+
+from collections import Counter, defaultdict
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# The metrics of the request being served, shared with the threads it hands work to
+current = contextvars.ContextVar('request_metrics', default=None)
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [1, 2, 5, 10, 20, 50, 100]
+
+
+class RequestMetrics(object):
+    '''Timings collected while serving one request. Upstream calls may be recorded from
+    other threads, hence the lock.'''
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.upstream_calls = 0
+        self.upstream_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self._lock = threading.Lock()
+
+    def add(self, **values):
+        with self._lock:
+            for name, value in values.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def server_timing(self, duration):
+        return ', '.join([
+            f'db;dur={self.query_time * 1000:.1f};desc="{self.queries} queries"',
+            f'mal;dur={self.upstream_time * 1000:.1f};desc="{self.upstream_calls} calls"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}'
+        ])
+
+
+def record_upstream(duration):
+    '''Records a call to the MyAnimeList API made on behalf of the current request.'''
+    metrics = current.get()
+    if metrics is not None:
+        metrics.add(upstream_calls=1, upstream_time=duration)
+
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    if current.get() is not None:
+        connection.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    metrics = current.get()
+    if metrics is not None and connection.info.get('query_start'):
+        metrics.add(queries=1, query_time=time.perf_counter() - connection.info['query_start'].pop())
+
+
+def timed_template_class(base):
+    '''Returns a template class that adds its render time to the current request. Only
+    the outermost template is timed, as it includes the time of the ones it renders.'''
+
+    class TimedTemplate(base):
+        def render(self, *args, **kwargs):
+            metrics = current.get()
+            if metrics is None:
+                return super(TimedTemplate, self).render(*args, **kwargs)
+            metrics.template_depth += 1
+            start = time.perf_counter()
+            try:
+                return super(TimedTemplate, self).render(*args, **kwargs)
+            finally:
+                metrics.template_depth -= 1
+                if metrics.template_depth == 0:
+                    metrics.add(template_time=time.perf_counter() - start)
+
+    return TimedTemplate
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Sampler(object):
+    '''Sampling profiler for the threads serving requests. A background thread records
+    the stack of every registered thread each interval, which costs the requests
+    themselves nothing beyond registering.'''
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.threads = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, thread_id):
+        with self._lock:
+            self.threads[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        '''Stops sampling a thread and returns the number of samples of each stack.'''
+        with self._lock:
+            return self.threads.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self.threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[self._stack(frame)] += 1
+
+    @staticmethod
+    def _stack(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+
+class Instrumentation(object):
+    '''Opt-in per-request instrumentation. Records the wall time, database queries,
+    MyAnimeList calls and template render time of every request, returns them in a
+    Server-Timing header and aggregates them per endpoint on a Prometheus text endpoint
+    at /metrics. Metrics are kept per process.
+
+    With PROFILE_SLOW_REQUESTS set, requests are sampled by a profiler and the stacks of
+    those slower than that many seconds are written to PROFILE_DIR in the collapsed
+    format read by flame graph tools.'''
+
+    def __init__(self, app=None):
+        self.requests = Counter()
+        self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.totals = defaultdict(float)
+        self.sampler = None
+        self.slow_threshold = 0
+        self.profile_dir = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['INSTRUMENTATION_ENABLED']:
+            return
+        self.slow_threshold = app.config['PROFILE_SLOW_REQUESTS']
+        self.profile_dir = app.config['PROFILE_DIR']
+        if self.slow_threshold > 0:
+            self.sampler = Sampler(app.config['PROFILE_INTERVAL'])
+        for name, listener in [('before_cursor_execute', before_cursor_execute),
+                ('after_cursor_execute', after_cursor_execute)]:
+            if not event.contains(Engine, name, listener):
+                event.listen(Engine, name, listener)
+        app.jinja_env.template_class = timed_template_class(app.jinja_env.template_class)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+        app.extensions['instrumentation'] = self
+
+    def before_request(self):
+        g.metrics_token = current.set(RequestMetrics())
+        if self.sampler is not None:
+            self.sampler.start(threading.get_ident())
+
+    def after_request(self, response):
+        metrics = current.get()
+        if metrics is None:
+            return response
+        duration = time.perf_counter() - metrics.start
+        response.headers['Server-Timing'] = metrics.server_timing(duration)
+        endpoint = request.endpoint or 'none'
+        with self._lock:
+            self.requests[(endpoint, request.method, response.status_code)] += 1
+            self.durations[endpoint].observe(duration)
+            self.queries[endpoint].observe(metrics.queries)
+            self.totals[('db_query_seconds_total', endpoint)] += metrics.query_time
+            self.totals[('mal_calls_total', endpoint)] += metrics.upstream_calls
+            self.totals[('mal_call_seconds_total', endpoint)] += metrics.upstream_time
+            self.totals[('template_render_seconds_total', endpoint)] += metrics.template_time
+        if self.sampler is not None:
+            stacks = self.sampler.stop(threading.get_ident())
+            if duration > self.slow_threshold and stacks:
+                self.dump(endpoint, duration, stacks)
+        return response
+
+    def teardown_request(self, exception=None):
+        if self.sampler is not None:
+            self.sampler.stop(threading.get_ident())
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            current.reset(token)
+
+    def dump(self, endpoint, duration, stacks):
+        '''Writes the sampled stacks of a slow request to the profile directory.'''
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f'{int(time.time() * 1000)}-{endpoint}.folded')
+        with open(path, 'w') as f:
+            for stack, samples in stacks.items():
+                f.write(f'{stack} {samples}\n')
+        logger.warning('Slow request to %s took %.0fms, profile written to %s',
+            request.path, duration * 1000, path)
+
+    def metrics(self):
+        '''Returns the metrics of this process in the Prometheus text format, along with
+        the counters kept by the MyAnimeList client and the caches.'''
+        lines = []
+
+        def histogram(name, description, histograms):
+            lines.extend([f'# HELP {name} {description}', f'# TYPE {name} histogram'])
+            for endpoint, values in sorted(histograms.items()):
+                for bound, count in zip(values.buckets, values.counts):
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {values.count}')
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {values.sum}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {values.count}')
+
+        def series(name, kind, description, samples):
+            lines.extend([f'# HELP {name} {description}', f'# TYPE {name} {kind}'])
+            for labels, value in samples:
+                lines.append(f'{name}{labels} {value}')
+
+        with self._lock:
+            lines.extend(['# HELP animetracker_requests_total Requests served.',
+                '# TYPE animetracker_requests_total counter'])
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'animetracker_requests_total{{endpoint="{endpoint}",'
+                    f'method="{method}",status="{status}"}} {count}')
+            histogram('animetracker_request_duration_seconds', 'Wall time of requests.',
+                self.durations)
+            histogram('animetracker_db_queries', 'Database queries made per request.',
+                self.queries)
+            for name, description in [
+                    ('db_query_seconds_total', 'Time spent in database queries.'),
+                    ('mal_calls_total', 'Calls made to the MyAnimeList API.'),
+                    ('mal_call_seconds_total', 'Time spent in MyAnimeList API calls.'),
+                    ('template_render_seconds_total', 'Time spent rendering templates.')]:
+                lines.extend([f'# HELP animetracker_{name} {description}',
+                    f'# TYPE animetracker_{name} counter'])
+                for (total, endpoint), value in sorted(self.totals.items()):
+                    if total == name:
+                        lines.append(f'animetracker_{name}{{endpoint="{endpoint}"}} {value}')
+        mal = current_app.extensions.get('mal')
+        if mal is not None:
+            stats = mal.stats()
+            series('animetracker_mal_searches_total', 'counter', 'MyAnimeList searches served.',
+                [('', stats['searches'])])
+            series('animetracker_mal_coalesced_searches_total', 'counter',
+                'MyAnimeList searches that shared the result of an identical one.',
+                [('', stats['coalesced'])])
+            series('animetracker_mal_search_upstream_calls_total', 'counter',
+                'Calls made to the MyAnimeList API by searches.', [('', stats['upstream_calls'])])
+            series('animetracker_mal_breaker_state', 'gauge',
+                'State of the MyAnimeList circuit breaker, 1 for the current one.',
+                [(f'{{state="{state}"}}', int(stats['breaker'] == state))
+                    for state in ('closed', 'half-open', 'open')])
+        fragments = current_app.extensions.get('fragments')
+        caches = [('mal', mal.cache if mal is not None else None),
+            ('user', current_app.extensions.get('user_cache')),
+            ('fragment', fragments.cache if fragments is not None else None)]
+        stats = [(f'{{cache="{name}"}}', cache.stats()) for name, cache in caches
+            if cache is not None]
+        for key, description in [('hits', 'Cache lookups that found an entry.'),
+                ('misses', 'Cache lookups that found no entry or an expired one.'),
+                ('evictions', 'Entries evicted to make room for new ones.')]:
+            series(f'animetracker_cache_{key}_total', 'counter', description,
+                [(labels, values[key]) for labels, values in stats])
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,115 @@
+import json
+import logging
+import random
+import time
+import traceback
+
+from app import db
+from app.models import Job
+from datetime import datetime, timedelta
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+handlers = {}
+periodic = {}
+
+
+def job(name, every=None):
+    '''Registers a function as the handler of the jobs with the given name. Periodic jobs
+    name the config setting holding their interval in seconds, and are kept scheduled
+    by the workers.'''
+    def decorator(f):
+        handlers[name] = f
+        if every is not None:
+            periodic[name] = every
+        return f
+    return decorator
+
+
+def enqueue(name, delay=0, unique=False, **payload):
+    '''Adds a job to the session, to be committed along with the caller's transaction.
+    Unique jobs are not added again while an identical one is waiting to run, in which
+    case that one is returned.'''
+    payload = json.dumps(payload, sort_keys=True)
+    if unique:
+        job = Job.query.filter_by(name=name, status='queued', payload=payload).first()
+        if job is not None:
+            return job
+    job = Job(name=name, payload=payload, run_at=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    return job
+
+
+def schedule(name, delay=0):
+    '''Enqueues a job unless one with the same name is already waiting to run.'''
+    if Job.query.filter_by(name=name, status='queued').first() is None:
+        enqueue(name, delay=delay)
+        db.session.commit()
+
+
+def requeue_stale():
+    '''Puts back the jobs left running by a worker that died before finishing them.'''
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['JOB_TIMEOUT'])
+    Job.query.filter(Job.status == 'running', Job.locked_at < cutoff) \
+        .update({'status': 'queued'}, synchronize_session=False)
+    db.session.commit()
+
+
+def claim():
+    '''Returns the next due job after marking it as running, or None if there is none.
+    The conditional update makes sure only one worker can claim a given job.'''
+    now = datetime.utcnow()
+    candidates = Job.query.filter(Job.status == 'queued', Job.run_at <= now) \
+        .order_by(Job.run_at).limit(5).all()
+    for candidate in candidates:
+        claimed = Job.query.filter_by(id=candidate.id, status='queued').update(
+            {'status': 'running', 'locked_at': now, 'attempts': Job.attempts + 1},
+            synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return Job.query.get(candidate.id)
+    return None
+
+
+def run(job):
+    '''Runs a claimed job. Failed jobs are retried with exponential backoff until they
+    run out of attempts.'''
+    name = job.name
+    handler = handlers.get(name)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler for job {job.name}')
+        handler(**json.loads(job.payload or '{}'))
+    except Exception:
+        db.session.rollback()
+        job.last_error = traceback.format_exc()
+        if job.attempts >= current_app.config['JOB_MAX_ATTEMPTS']:
+            job.status = 'failed'
+            logger.error('Job %s %s failed for good:\n%s', job.id, job.name, job.last_error)
+        else:
+            backoff = current_app.config['JOB_BACKOFF'] * 2 ** (job.attempts - 1)
+            job.status = 'queued'
+            job.run_at = datetime.utcnow() + timedelta(seconds=backoff * random.uniform(1, 1.5))
+            logger.warning('Job %s %s failed, retrying in %ds', job.id, job.name, backoff)
+    else:
+        db.session.delete(job)
+    db.session.commit()
+    if name in periodic:
+        schedule(name, delay=current_app.config[periodic[name]])
+
+
+def work(once=False):
+    '''Runs due jobs until interrupted, polling the queue when it is empty.'''
+    # Register the job handlers
+    from app import tasks
+    requeue_stale()
+    for name in periodic:
+        schedule(name)
+    while True:
+        job = claim()
+        if job is not None:
+            run(job)
+        elif once:
+            return
+        else:
+            time.sleep(current_app.config['JOB_POLL_INTERVAL'])
@@ -1,6 +1,8 @@
+from app.models import STATUSES
 from datetime import date
 from flask import request
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import DateField, IntegerField, SelectField, SearchField, SubmitField
 from wtforms.validators import DataRequired, Optional
 
@@ -23,7 +25,7 @@ class TrackerForm(FlaskForm):
     watched_episodes = IntegerField('Episodes Watched', default=0, validators=[Optional()])
     start_date = DateField('Start Date', default=date.today, validators=[Optional()])
     end_date = DateField('End Date', default=date.today, validators=[Optional()])
-    status = SelectField('Status', choices=['Watching', 'Completed', 'Holding', 'Dropped', 'Planning'])
+    status = SelectField('Status', choices=STATUSES)
     submit = SubmitField('Submit')
 
     def __init__(self, anime, *args, **kwargs):
@@ -32,4 +34,10 @@ class TrackerForm(FlaskForm):
 
 
 class DeleteForm(FlaskForm):
-    submit = SubmitField('Delete')
\ No newline at end of file
+    submit = SubmitField('Delete')
+
+
+class ImportForm(FlaskForm):
+    file = FileField('MyAnimeList XML export or CSV file', validators=[FileRequired(),
+        FileAllowed(['xml', 'csv'], 'Only XML and CSV files can be imported.')])
+    submit = SubmitField('Import')
\ No newline at end of file
@@ -1,13 +1,21 @@
-import requests
+import math
 
-from app import db
+from app import db, images, mal, search_limiter, suggestions
+from app.jobs import enqueue
 from app.main import bp
-from app.main.forms import DeleteForm, SearchForm, TrackerForm
-from app.models import Anime, Tracker
+from app.main.forms import DeleteForm, ImportForm, SearchForm, TrackerForm
+from app.models import Anime, Tracker, UserStats, validate_progress
+from app.pagination import paginate_keyset
+from app.search import search_local
+from app.transfer import export_csv, export_json, import_trackers, iter_csv, iter_mal_xml
 from datetime import datetime
-from flask import current_app, flash, redirect, render_template, request, url_for
+from flask import Response, abort, current_app, flash, jsonify, redirect, render_template, \
+    request, send_file, stream_with_context, url_for
 from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from urllib.parse import parse_qs, urlparse
+from werkzeug.exceptions import TooManyRequests
 
 
 @bp.route('/')
@@ -21,56 +29,48 @@ def index():
     search_form = SearchForm()
     page = request.args.get('page', 1, type=int)
     status = request.args.get('status', type=str)
-    trackers = current_user.trackers
+    stats = UserStats.for_user(current_user.id)
+    if status is not None and status != '' and stats.counts.get(status) == 0:
+        # Skip the tracker query when the summary says there is nothing to list
+        flash(f'No tracker found with the status: {status}')
+        return redirect(url_for('main.index'))
+    # Load each anime along with its tracker instead of lazily per row
+    trackers = current_user.trackers.options(joinedload(Tracker.anime))
     if status is not None and status != '':
         # Filter the list of trackers by status
         trackers = trackers.filter_by(status=status)
-        if trackers.first() is None:
+    per_page = current_app.config['TRACKERS_PER_PAGE']
+    if current_app.config['TRACKERS_PAGINATION'] == 'cursor':
+        # Seek to the cursor in most recently updated order, skipping the count
+        cursor = request.args.get('cursor', type=str)
+        trackers = paginate_keyset(trackers, (Tracker.timestamp, Tracker.id), cursor, per_page)
+        if status is not None and status != '' and not trackers.items and not cursor:
+            # Check if there is a tracker
+            flash(f'No tracker found with the status: {status}')
+            return redirect(url_for('main.index'))
+        next_url = url_for('main.index', cursor=trackers.next_cursor, status=status) if trackers.has_next else None
+        prev_url = url_for('main.index', cursor=trackers.prev_cursor, status=status) if trackers.has_prev else None
+    else:
+        # Order by most recently updated
+        trackers = trackers.order_by(Tracker.timestamp.desc(), Tracker.id.desc()).paginate(
+            page, per_page, False)
+        if status is not None and status != '' and trackers.total == 0:
             # Check if there is a tracker
             flash(f'No tracker found with the status: {status}')
             return redirect(url_for('main.index', page=page))
-    # Order by most recently updated
-    trackers = trackers.order_by(Tracker.timestamp.desc()).paginate(
-        page, current_app.config['TRACKERS_PER_PAGE'], False)
-    next_url = url_for('main.index', page=trackers.next_num, status=status) if trackers.has_next else None
-    prev_url = url_for('main.index', page=trackers.prev_num, status=status) if trackers.has_prev else None
+        next_url = url_for('main.index', page=trackers.next_num, status=status) if trackers.has_next else None
+        prev_url = url_for('main.index', page=trackers.prev_num, status=status) if trackers.has_prev else None
     return render_template('index.html', title='Home', delete_form=delete_form, 
-        search_form=search_form, trackers=trackers.items, 
+        search_form=search_form, trackers=trackers.items, stats=stats,
         status=status, next_url=next_url, prev_url=prev_url)
 
 
 @bp.route('/search')
 @login_required
 def search():
-    '''Returns the results of searching via using MyAnimeList API. Also grants access for
+    '''Returns the results of searching the local anime catalog, or the MyAnimeList API
+    when nothing matches locally or more results are asked for. Also grants access for
     tracking watch progress for the anime.'''
-    def get_api_request(q, offset):
-        payload = {'q': q, 'offset': offset}
-        base_url = current_app.config['MAL_BASE_URL']
-        response = requests.get(base_url, params=payload, headers=current_app.config['MAL_HEADERS'])
-        if response.status_code == 200:
-            response = response.json()
-            data = {'animes': [], 'paging': response['paging']}
-            for anime in response['data']:
-                id = anime['node']['id']
-                fields = {'fields': 'num_episodes'}
-                details = requests.get(f'{base_url}/{id}', params=fields, 
-                    headers=current_app.config['MAL_HEADERS'])
-                if details.status_code == 200:
-                    details = details.json()
-                    if details is not None and details.get('title') is not None:
-                        detail = {
-                            'title': details['title'],
-                            'image_url': details['main_picture'].get('medium') 
-                                if details.get('main_picture') else '',
-                            'total_episodes': details['num_episodes'] 
-                                if details.get('num_episodes') else 0
-                        }
-                        data['animes'].append(detail)
-            return data
-        else:
-            return None
-    
     def get_offset(url):
         parsed_url = urlparse(url)
         try:
@@ -85,56 +85,118 @@ def search():
         flash('No search query entered!')
         return redirect(url_for('main.index'))
     offset = request.args.get('offset', 0, type=int)
-    data = get_api_request(q, offset)
+    source = request.args.get('source', 'local', type=str)
+    per_page = current_app.config['ANIMES_PER_PAGE']
+
+    def render_local(animes, has_more):
+        next_offset = offset + per_page if has_more else None
+        prev_offset = max(offset - per_page, 0) if offset > 0 else None
+        return render_template('search.html', title='Search', animes=animes, q=q,
+            source='local', next_offset=next_offset, prev_offset=prev_offset)
+
+    searched_local = source == 'local'
+    if searched_local:
+        animes, has_more = search_local(q, per_page, offset)
+        if animes or offset > 0:
+            # Later pages of a local search stay local, even past the last match
+            return render_local(animes, has_more)
+        # Nothing matched locally, so go to MyAnimeList
+        source = 'mal'
+    # Only searches that reach MyAnimeList count against the limits, not cached pages
+    if not mal.cached(q, offset):
+        retry_after = search_limiter.hit(current_user.id)
+        if retry_after:
+            raise TooManyRequests(retry_after=math.ceil(retry_after))
+    data = mal.search(q, offset)
     if data is None:
+        if not searched_local:
+            # MyAnimeList is failing, so fall back to the animes already in the catalog
+            animes, has_more = search_local(q, per_page, offset)
+            if animes:
+                flash('MyAnimeList is unavailable, showing animes already in Anime Tracker.')
+                return render_local(animes, has_more)
         flash(f'Could not find anime with search query: {q}')
         return redirect(url_for('main.index'))
-    animes = []
-    for anime_data in data['animes']:
-        # Get anime from db or create new one to store
-        anime = Anime.query.filter_by(title=anime_data['title']).first()
-        if anime is None:
-            anime = Anime(title=anime_data['title'][:100], 
-                image_url=anime_data['image_url'], total_episodes=anime_data['total_episodes'])
-            db.session.add(anime)
-            db.session.commit()
-            anime = Anime.query.filter_by(title=anime.title).first()
-        animes.append(anime)
+    animes = Anime.upsert_many(data['animes'])
+    suggestions.add([anime.title for anime in animes])
+    # The page may come from the cache, so only enqueue the animes still not filled in
+    incomplete = [anime.mal_id for anime in animes
+        if anime.mal_id in data['incomplete'] and anime.last_fetched_at is None]
+    if incomplete:
+        # Fill in the missing details in the background rather than holding up the page
+        enqueue('enrich_anime', unique=True, mal_ids=incomplete)
+    db.session.commit()
     next_offset = get_offset(data['paging']['next']) if data['paging'].get('next') is not None else None
     prev_offset = get_offset(data['paging']['previous']) if data['paging'].get('previous') is not None else None
     return render_template('search.html', title='Search', animes=animes, q=q, 
-        next_offset=next_offset, prev_offset=prev_offset)
+        source=source, next_offset=next_offset, prev_offset=prev_offset)
+
+
+@bp.route('/search/suggest')
+@login_required
+def suggest():
+    '''Returns titles from the catalog starting with the query, for autocompletion.'''
+    q = request.args.get('q', '', type=str).strip()
+    response = jsonify({'suggestions': suggestions.suggest(q) if q else []})
+    response.cache_control.private = True
+    response.cache_control.max_age = 60
+    return response
+
+
+@bp.route('/img/<int:anime_id>')
+@login_required
+def image(anime_id):
+    '''Serves a thumbnail of the cover art of an anime from the local image cache, which
+    fetches it from MyAnimeList the first time. Redirects to the original image if it
+    cannot be fetched.'''
+    anime = Anime.query.get_or_404(anime_id)
+    if not anime.image_url:
+        abort(404)
+    cached = images.get(anime.image_url)
+    if cached is None:
+        return redirect(anime.image_url)
+    path, digest, mimetype = cached
+    # Sent with X-Sendfile when USE_X_SENDFILE is set, or the server's file wrapper otherwise
+    response = send_file(path, mimetype=mimetype, etag=digest, conditional=True,
+        max_age=current_app.config['IMAGE_MAX_AGE'])
+    # Only logged in users may fetch it, so shared caches must not keep a copy
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if request.args.get('v') is not None:
+        # Pages link to the anime version, so a changed image comes with a new url
+        response.cache_control.immutable = True
+    return response
 
 
 @bp.route('/<anime_id>/track', methods=['GET', 'POST'])
 @login_required
 def track(anime_id):
-    '''Returns a form to create a progress tracker for an anime if the anime has not been
-    tracked yet. Otherwise return to the home page as it has already been tracked.
-    Upon submit, handles the logic for adding the progress tracker to the database.'''
+    '''Returns a form to create a progress tracker for an anime. Upon submit, handles the
+    logic for adding the progress tracker to the database, returning to the home page
+    if the anime has already been tracked.'''
     anime = Anime.query.filter_by(id=anime_id).first_or_404()
-    found_tracker = Tracker.query.filter_by(user=current_user, anime=anime).first()
-    if found_tracker is not None:
-        flash(f'You are already tracking { anime.title }.')
-        return redirect(url_for('main.index'))
     tracker_form = TrackerForm(anime)
     if tracker_form.validate_on_submit():
         if tracker_form.watched_episodes.data is None:
             tracker_form.watched_episodes.data = 0
-        if tracker_form.watched_episodes.data < 0:
-            flash('Watched episodes cannot be negative.')
-            return redirect(url_for('main.track', anime_id=anime_id))
-        if anime.total_episodes != 0 and tracker_form.watched_episodes.data > anime.total_episodes:
-            flash(f'Watched episodes cannot exceed {anime.total_episodes}.')
-            return redirect(url_for('main.track', anime_id=anime_id))
-        if tracker_form.start_date.data is not None and tracker_form.end_date.data is not None and tracker_form.start_date.data > tracker_form.end_date.data:
-            flash('Start date cannot be pased end date.')
+        error = validate_progress(anime, tracker_form.watched_episodes.data,
+            tracker_form.start_date.data, tracker_form.end_date.data)
+        if error is not None:
+            flash(error)
             return redirect(url_for('main.track', anime_id=anime_id))
         tracker = Tracker(user=current_user, anime=anime, 
             watched_episodes=tracker_form.watched_episodes.data, 
             start_date=tracker_form.start_date.data, end_date=tracker_form.end_date.data, 
             status=tracker_form.status.data)
         db.session.add(tracker)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # The unique (user_id, anime_id) index rejects a second tracker
+            db.session.rollback()
+            flash(f'You are already tracking { anime.title }.')
+            return redirect(url_for('main.index'))
+        UserStats.adjust(current_user.id, [(None, (tracker.status, tracker.watched_episodes))])
         db.session.commit()
         flash(f'You tracked your progress for { anime.title }!')
         return redirect(url_for('main.index'))
@@ -154,20 +216,18 @@ def edit_tracker(tracker_id):
     if tracker_form.validate_on_submit():
         if tracker_form.watched_episodes.data is None:
             tracker_form.watched_episodes.data = 0
-        if tracker_form.watched_episodes.data < 0:
-            flash('Watched episodes cannot be negative.')
-            return redirect(url_for('main.edit_tracker', tracker_id=tracker_id))
-        if tracker.anime.total_episodes != 0 and tracker_form.watched_episodes.data > tracker.anime.total_episodes:
-            flash(f'Watched episodes cannot exceed {tracker.anime.total_episodes}.')
-            return redirect(url_for('main.edit_tracker', tracker_id=tracker_id))
-        if tracker_form.start_date.data is not None and tracker_form.end_date.data is not None and tracker_form.start_date.data > tracker_form.end_date.data:
-            flash('Start date cannot be pased end date.')
+        error = validate_progress(tracker.anime, tracker_form.watched_episodes.data,
+            tracker_form.start_date.data, tracker_form.end_date.data)
+        if error is not None:
+            flash(error)
             return redirect(url_for('main.edit_tracker', tracker_id=tracker_id))
+        before = (tracker.status, tracker.watched_episodes)
         tracker.watched_episodes = tracker_form.watched_episodes.data
         tracker.start_date = tracker_form.start_date.data
         tracker.end_date = tracker_form.end_date.data
         tracker.status = tracker_form.status.data
         tracker.timestamp = datetime.utcnow()
+        UserStats.adjust(tracker.user_id, [(before, (tracker.status, tracker.watched_episodes))])
         db.session.commit()
         flash(f'You updated your progress for { tracker.anime.title }!')
         return redirect(url_for('main.index'))
@@ -188,6 +248,45 @@ def delete_tracker(tracker_id):
     tracker = Tracker.query.filter_by(id=tracker_id).first_or_404()
     title = tracker.anime.title
     db.session.delete(tracker)
+    UserStats.adjust(tracker.user_id, [((tracker.status, tracker.watched_episodes), None)])
     db.session.commit()
     flash(f'Successfully deleted tracker for {title}!')
-    return redirect(url_for('main.index'))
\ No newline at end of file
+    return redirect(url_for('main.index'))
+
+
+@bp.route('/stats')
+@login_required
+def stats():
+    '''Returns the tracker statistics of the current user.'''
+    return render_template('stats.html', title='Statistics',
+        stats=UserStats.for_user(current_user.id))
+
+
+@bp.route('/trackers/import', methods=['GET', 'POST'])
+@login_required
+def import_list():
+    '''Returns a form for importing a MyAnimeList XML export or a CSV file of trackers and
+    handles the logic for streaming it into the database upon submit.'''
+    form = ImportForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        rows = iter_mal_xml(upload.stream) if upload.filename.lower().endswith('.xml') \
+            else iter_csv(upload.stream)
+        imported, skipped = import_trackers(current_user.id, rows)
+        flash(f'Imported {imported} trackers, skipped {skipped} entries.')
+        return redirect(url_for('main.index'))
+    return render_template('import.html', title='Import', form=form)
+
+
+@bp.route('/trackers/export.<format>')
+@login_required
+def export_list(format):
+    '''Streams the trackers of the current user as a CSV or JSON download.'''
+    if format == 'csv':
+        rows, mimetype = export_csv(current_user.id), 'text/csv'
+    elif format == 'json':
+        rows, mimetype = export_json(current_user.id), 'application/json'
+    else:
+        abort(404)
+    return Response(stream_with_context(rows), mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=trackers.{format}'})
@@ -0,0 +1 @@
+from app.mal.client import MALClient
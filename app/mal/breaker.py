@@ -0,0 +1,52 @@
+import threading
+import time
+
+
+class CircuitBreaker(object):
+    '''Thread-safe circuit breaker. Once threshold calls in a row have failed, the breaker
+    opens and calls fail fast for reset_timeout seconds. A single trial call is then let
+    through, which closes the breaker if it succeeds and opens it again if it fails.'''
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.trial else 'open'
+
+    @property
+    def available(self):
+        '''Whether a call would be let through, without letting it through.'''
+        return self.opened_at is None or \
+            (not self.trial and time.monotonic() - self.opened_at >= self.reset_timeout)
+
+    def allow(self):
+        '''Returns whether a call may be made, letting through a trial call once the
+        breaker has been open for long enough.'''
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self.trial = False
@@ -0,0 +1,275 @@
+import contextvars
+import requests
+import threading
+import time
+
+from app.cache import make_cache
+from app.instrumentation import record_upstream
+from app.mal.breaker import CircuitBreaker
+from app.mal.singleflight import SingleFlight
+from app.ratelimit import make_limiter
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+
+
+class MALClient(object):
+    '''Client for the MyAnimeList API. A search page and the details of its animes are
+    fetched with a single request; the few nodes that come back incomplete are looked
+    up concurrently on a bounded thread pool, or left to a background job. Search pages
+    and details are cached separately, keyed by (q, offset) and by MAL id, and every
+    upstream call goes through a rate limiter, shared by all processes when it is kept
+    in Redis.
+
+    Concurrent identical searches are coalesced into one. Calls share a pooled session,
+    so connections are kept alive between them, and are retried with backoff on
+    connection errors, 429 and 5xx responses. Every wait, attempt and retry of a search
+    fits within its deadline of MAL_SEARCH_DEADLINE seconds, so that a page is never
+    held up for longer than that. A circuit breaker makes calls fail fast while the API
+    is down, leaving only cached pages to be served.'''
+
+    FIELDS = 'num_episodes,status'
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+    MAX_RETRY_AFTER = 5
+
+    def __init__(self, app=None):
+        self.base_url = None
+        self.headers = {}
+        self.limit = None
+        self.timeout = None
+        self.deadline = None
+        self.retries = 0
+        self.backoff = 0
+        self.executor = None
+        self.cache = None
+        self.search_ttl = None
+        self.detail_ttl = None
+        self.limiter = None
+        self.breaker = None
+        self.session = None
+        self.enrich_async = False
+        self.flights = SingleFlight()
+        self.searches = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.base_url = app.config['MAL_BASE_URL']
+        self.headers = app.config['MAL_HEADERS']
+        self.limit = app.config['ANIMES_PER_PAGE']
+        self.timeout = (app.config['MAL_CONNECT_TIMEOUT'], app.config['MAL_REQUEST_TIMEOUT'])
+        self.deadline = app.config['MAL_SEARCH_DEADLINE']
+        self.retries = app.config['MAL_RETRIES']
+        self.backoff = app.config['MAL_RETRY_BACKOFF']
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config['MAL_MAX_WORKERS'], thread_name_prefix='mal')
+        self.cache = make_cache(app.config['MAL_CACHE_BACKEND'],
+            app.config['MAL_CACHE_SIZE'], app.config['MAL_CACHE_URL'])
+        self.search_ttl = app.config['MAL_SEARCH_TTL']
+        self.detail_ttl = app.config['MAL_DETAIL_TTL']
+        self.limiter = make_limiter(app.config['RATE_LIMIT_BACKEND'], app.config['MAL_RATE_LIMIT'],
+            app.config['MAL_RATE_BURST'], app.config['RATE_LIMIT_URL'])
+        self.breaker = CircuitBreaker(app.config['MAL_BREAKER_THRESHOLD'],
+            app.config['MAL_BREAKER_RESET'])
+        if self.session is not None:
+            self.session.close()
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # One connection per worker thread, kept alive between calls. Retries are made by
+        # _get, which unlike urllib3 can stop retrying once the deadline has passed
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=app.config['MAL_MAX_WORKERS'],
+            max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.enrich_async = app.config['MAL_ENRICH_ASYNC']
+        app.extensions['mal'] = self
+
+    def _get(self, url, params, deadline=None):
+        '''Performs a GET request against the API, returning the decoded body or None.
+        Requests wait for the rate limiter, and count as failed if that takes longer than
+        the read timeout or if the circuit breaker is open. Connection errors, 429 and
+        5xx responses are retried up to MAL_RETRIES times with exponential backoff, or
+        after their Retry-After of at most MAX_RETRY_AFTER seconds. Nothing is waited
+        for or attempted past the deadline, a time.monotonic() value that defaults to
+        MAL_SEARCH_DEADLINE seconds from now, and attempts are cut short to meet it.'''
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline
+        # Check the breaker before waiting on the limiter, so that an open breaker fails fast
+        if not self.breaker.available or not self.limiter.acquire('mal',
+                timeout=max(min(self.timeout[1], deadline - time.monotonic()), 0)) \
+                or not self.breaker.allow():
+            return None
+        response = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                delay = self._retry_delay(attempt, response)
+                if time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=(
+                    min(self.timeout[0], remaining), min(self.timeout[1], remaining)))
+            except requests.ConnectionError:
+                # GET is idempotent, so the request can safely be made again
+                response = None
+                continue
+            except requests.RequestException:
+                response = None
+                break
+            finally:
+                record_upstream(time.perf_counter() - start)
+            if response.status_code not in self.RETRY_STATUSES:
+                break
+        if response is None or response.status_code == 429 or response.status_code >= 500:
+            self.breaker.record_failure()
+            return None
+        self.breaker.record_success()
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    def _retry_delay(self, attempt, response):
+        '''Returns how long to wait before a retry, as asked by the Retry-After header of
+        the last response if it has one, or backing off exponentially otherwise.'''
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None:
+            try:
+                return min(max(float(retry_after), 0), self.MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+        return self.backoff * 2 ** (attempt - 1)
+
+    def _parse(self, node):
+        '''Returns the title, image and episode count of an anime from an API node, or
+        None if the node does not carry all of them.'''
+        if node.get('title') is None or 'num_episodes' not in node:
+            return None
+        return {
+            'title': node['title'],
+            'image_url': node['main_picture'].get('medium')
+                if node.get('main_picture') else '',
+            'total_episodes': node['num_episodes'] if node.get('num_episodes') else 0,
+            'airing_status': node.get('status')
+        }
+
+    def _fetch_details(self, id, deadline):
+        '''Fetches the details of a single anime from the API and caches them.'''
+        details = self._get(f'{self.base_url}/{id}', {'fields': self.FIELDS}, deadline)
+        if details is None:
+            return None
+        detail = self._parse(details)
+        if detail is not None:
+            self.cache.set(f'anime:{id}', detail, self.detail_ttl)
+        return detail
+
+    def get_details(self, ids, refresh=False, deadline=None):
+        '''Returns the details of the given animes in order, with None for the ones that
+        could not be fetched, along with the number of upstream calls it took. Cache
+        misses, or every anime when refreshing, are fetched concurrently and abandoned
+        once the deadline passes, MAL_SEARCH_DEADLINE seconds from now by default.'''
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline
+        details = [None if refresh else self.cache.get(f'anime:{id}') for id in ids]
+        # Run each lookup in a copy of the caller's context to record it for their request
+        futures = {index: self.executor.submit(contextvars.copy_context().run,
+                self._fetch_details, id, deadline)
+            for index, id in enumerate(ids) if details[index] is None}
+        if futures:
+            done, not_done = wait(futures.values(), timeout=max(deadline - time.monotonic(), 0))
+            for future in not_done:
+                future.cancel()
+            for index, future in futures.items():
+                if future in done and future.exception() is None:
+                    details[index] = future.result()
+        return details, len(futures)
+
+    def search(self, q, offset):
+        '''Returns the same as _search, sharing the result of an identical search that is
+        already in flight rather than fetching the page again. Only the search that made
+        the calls reports them and the incomplete nodes, so that they are enqueued once.'''
+        data, shared = self.flights.do(self._key(q, offset), self._search, q, offset)
+        if shared:
+            with self._stats_lock:
+                self.coalesced += 1
+            if data is not None:
+                data = dict(data, incomplete=[], upstream_calls=0)
+        return data
+
+    def cached(self, q, offset):
+        '''Returns whether the search page is cached, in which case searching for it
+        makes no search call to the API.'''
+        return self.cache.contains(self._key(q, offset))
+
+    @staticmethod
+    def _key(q, offset):
+        return f'search:{offset}:{q.strip().lower()}'
+
+    def _search(self, q, offset):
+        '''Returns a page of search results with their details, or None if the search
+        request itself failed. The details are requested in the search call itself, so
+        separate detail lookups are only made for nodes that came back without them.
+
+        When enrichment is asynchronous, incomplete nodes are returned as they are and
+        their ids listed under 'incomplete' for a background job to fill in. Otherwise
+        they are looked up right away, and the ones that fail or miss the deadline are
+        left out of the page. The search and the lookups share a single deadline.'''
+        deadline = time.monotonic() + self.deadline
+        calls = 0
+        key = self._key(q, offset)
+        page = self.cache.get(key)
+        if page is None:
+            response = self._get(self.base_url, {'q': q, 'offset': offset,
+                'limit': self.limit, 'fields': self.FIELDS}, deadline)
+            calls += 1
+            if response is None:
+                self._record(calls)
+                return None
+            page = {'animes': [], 'paging': response.get('paging', {})}
+            for anime in response['data']:
+                node = anime['node']
+                if node.get('title') is None:
+                    continue
+                detail = self._parse(node)
+                if detail is not None:
+                    self.cache.set(f'anime:{node["id"]}', detail, self.detail_ttl)
+                else:
+                    detail = self._parse(dict(node, num_episodes=0))
+                page['animes'].append(dict(detail, mal_id=node['id'],
+                    complete='num_episodes' in node))
+            self.cache.set(key, page, self.search_ttl)
+        missing = [anime['mal_id'] for anime in page['animes'] if not anime['complete']]
+        if self.enrich_async:
+            details = [self.cache.get(f'anime:{id}') for id in missing]
+        else:
+            details, fetched = self.get_details(missing, deadline=deadline)
+            calls += fetched
+        details = dict(zip(missing, details))
+        data = {'animes': [], 'paging': page['paging'], 'incomplete': [],
+            'upstream_calls': calls}
+        for anime in page['animes']:
+            if anime['complete']:
+                data['animes'].append(anime)
+            elif details[anime['mal_id']] is not None:
+                data['animes'].append(dict(details[anime['mal_id']], mal_id=anime['mal_id']))
+            elif self.enrich_async:
+                data['animes'].append(anime)
+                data['incomplete'].append(anime['mal_id'])
+        self._record(calls)
+        return data
+
+    def _record(self, calls):
+        with self._stats_lock:
+            self.searches += 1
+            self.upstream_calls += calls
+
+    def stats(self):
+        '''Returns the number of searches served, the ones coalesced into another, the
+        upstream calls they made and the state of the circuit breaker.'''
+        return {'searches': self.searches, 'coalesced': self.coalesced,
+            'upstream_calls': self.upstream_calls, 'breaker': self.breaker.state}
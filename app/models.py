@@ -1,10 +1,17 @@
 import enum
+import hashlib
 
 from app import db, login
+from collections import Counter
 from datetime import date, datetime
+from flask import current_app, has_app_context
 from flask_login import UserMixin
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.security import generate_password_hash, check_password_hash
 
+STATUSES = ['Watching', 'Completed', 'Holding', 'Dropped', 'Planning']
+
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -25,14 +32,79 @@ class User(UserMixin, db.Model):
 
 class Anime(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(100), index=True, unique=True)
+    mal_id = db.Column(db.Integer, index=True, unique=True)
+    title = db.Column(db.String(100), index=True)
     image_url = db.Column(db.String(200), default='')
     total_episodes = db.Column(db.Integer)
+    airing_status = db.Column(db.String(32), nullable=True)
+    last_fetched_at = db.Column(db.DateTime, index=True, nullable=True)
     trackers = db.relationship('Tracker', backref='anime', lazy='dynamic')
 
     def __repr__(self):
         return f'<Anime {self.title}>'
 
+    @property
+    def version(self):
+        '''A fingerprint of the columns shown on pages, which changes whenever they do.'''
+        content = f'{self.title}\0{self.image_url}\0{self.total_episodes}'
+        return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+    @classmethod
+    def upsert_many(cls, rows):
+        '''Returns the animes for the given rows in order, storing the ones that are not
+        in the database yet and filling in the ones first stored incomplete once a row
+        comes back complete. Animes are keyed by their MyAnimeList id: existing ones are
+        looked up with a single query and the rest are written with a single INSERT ...
+        ON CONFLICT, so that concurrent searches for the same animes do not race on the
+        unique index. Changes are flushed, and left for the caller to commit.'''
+        now = datetime.utcnow()
+        rows = [{
+            'mal_id': row['mal_id'],
+            'title': row['title'][:100],
+            'image_url': row['image_url'],
+            'total_episodes': row['total_episodes'],
+            'airing_status': row.get('airing_status'),
+            'last_fetched_at': now if row.get('complete', True) else None
+        } for row in rows]
+        ids = [row['mal_id'] for row in rows]
+        animes = {anime.mal_id: anime for anime in cls.query.filter(cls.mal_id.in_(ids))}
+        missing = {row['mal_id']: row for row in rows if row['mal_id'] not in animes}
+        incomplete = {row['mal_id']: row for row in rows if row['last_fetched_at'] is not None
+            and row['mal_id'] in animes and animes[row['mal_id']].last_fetched_at is None}
+        if missing:
+            # Adopt the animes stored before they were keyed by MyAnimeList id
+            titles = {row['title']: row['mal_id'] for row in missing.values()}
+            legacy = cls.query.filter(cls.mal_id.is_(None), cls.title.in_(titles))
+            for anime in legacy:
+                anime.mal_id = titles[anime.title]
+                del missing[anime.mal_id]
+            db.session.flush()
+        if missing or incomplete:
+            dialect = db.engine.dialect.name
+            if dialect in ('postgresql', 'sqlite'):
+                insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+                complete = [row for row in list(missing.values()) + list(incomplete.values())
+                    if row['last_fetched_at'] is not None]
+                if complete:
+                    statement = insert(cls.__table__).values(complete)
+                    db.session.execute(statement.on_conflict_do_update(index_elements=['mal_id'],
+                        set_={key: statement.excluded[key] for key in complete[0] if key != 'mal_id'},
+                        where=cls.__table__.c.last_fetched_at.is_(None)))
+                partial = [row for row in missing.values() if row['last_fetched_at'] is None]
+                if partial:
+                    db.session.execute(insert(cls.__table__).values(partial)
+                        .on_conflict_do_nothing(index_elements=['mal_id']))
+            else:
+                db.session.add_all([cls(**row) for row in missing.values()])
+                for mal_id, row in incomplete.items():
+                    for key, value in row.items():
+                        setattr(animes[mal_id], key, value)
+            db.session.flush()
+            # Reload the whole page at once, including the rows written behind the session
+            animes = {anime.mal_id: anime for anime in
+                cls.query.filter(cls.mal_id.in_(ids)).populate_existing()}
+        return [animes[id] for id in ids if id in animes]
+
 
 class Tracker(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -43,15 +115,181 @@ class Tracker(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     anime_id = db.Column(db.Integer, db.ForeignKey('anime.id'))
+    __table_args__ = (
+        db.Index('ix_tracker_user_id_anime_id', user_id, anime_id, unique=True),
+        db.Index('ix_tracker_user_id_status_timestamp', user_id, status, timestamp.desc(), id.desc()),
+        db.Index('ix_tracker_user_id_timestamp', user_id, timestamp.desc(), id.desc()),
+        db.Index('ix_tracker_anime_id', anime_id),
+    )
+
+    def __repr__(self):
+        return f'<Tracker (User={self.user_id}, Anime={self.anime_id})>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'anime': {
+                'id': self.anime.id,
+                'mal_id': self.anime.mal_id,
+                'title': self.anime.title,
+                'image_url': self.anime.image_url,
+                'total_episodes': self.anime.total_episodes
+            },
+            'watched_episodes': self.watched_episodes,
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'status': self.status,
+            'timestamp': self.timestamp.isoformat() + 'Z' if self.timestamp else None
+        }
+
+
+class UserStats(db.Model):
+    '''A summary of each user's trackers, adjusted as trackers are added, edited and
+    deleted so that statistics never need to aggregate a whole list.'''
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    watching = db.Column(db.Integer, default=0, nullable=False)
+    completed = db.Column(db.Integer, default=0, nullable=False)
+    holding = db.Column(db.Integer, default=0, nullable=False)
+    dropped = db.Column(db.Integer, default=0, nullable=False)
+    planning = db.Column(db.Integer, default=0, nullable=False)
+    episodes_watched = db.Column(db.Integer, default=0, nullable=False)
+
+    COLUMNS = [status.lower() for status in STATUSES] + ['episodes_watched']
 
     def __repr__(self):
-        user = User.query.get(self.user_id)
-        anime = Anime.query.get(self.anime_id)
-        if user is None or anime is None:
-            return 'None'
-        return f'<Tracker (User={user}, Anime={anime})>'
+        return f'<UserStats (User={self.user_id})>'
+
+    @property
+    def counts(self):
+        return {status: getattr(self, status.lower()) for status in STATUSES}
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    @property
+    def completion_rate(self):
+        return self.completed / self.total if self.total else 0.0
+
+    def to_dict(self):
+        return {
+            'counts': self.counts,
+            'total': self.total,
+            'episodes_watched': self.episodes_watched,
+            'completion_rate': round(self.completion_rate, 4)
+        }
+
+    @classmethod
+    def empty(cls, user_id):
+        return cls(user_id=user_id, **dict.fromkeys(cls.COLUMNS, 0))
+
+    @classmethod
+    def for_user(cls, user_id):
+        '''Returns the summary of a user, or an empty one if they do not have one yet.'''
+        return cls.query.get(user_id) or cls.empty(user_id)
+
+    @staticmethod
+    def aggregate():
+        '''Returns a query computing the summary of every user from their trackers,
+        including the users without any.'''
+        return db.session.query(User.id,
+            *[db.func.count(db.case((Tracker.status == status, 1))) for status in STATUSES],
+            db.func.coalesce(db.func.sum(Tracker.watched_episodes), 0)) \
+            .outerjoin(Tracker, Tracker.user_id == User.id).group_by(User.id)
+
+    @classmethod
+    def rebuild(cls, user_id=None):
+        '''Recomputes the summary of a user, or of every user, from their trackers. The
+        summaries are upserted, so a rebuild can safely race with another one.'''
+        aggregate = cls.aggregate()
+        if user_id is not None:
+            aggregate = aggregate.filter(User.id == user_id)
+        columns = ['user_id'] + cls.COLUMNS
+        dialect = db.engine.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            statement = insert(cls.__table__).from_select(columns, aggregate.statement)
+            db.session.execute(statement.on_conflict_do_update(index_elements=['user_id'],
+                set_={column: statement.excluded[column] for column in cls.COLUMNS}))
+        else:
+            stats = cls.query
+            if user_id is not None:
+                stats = stats.filter_by(user_id=user_id)
+            stats.delete(synchronize_session=False)
+            db.session.execute(cls.__table__.insert().from_select(columns, aggregate.statement))
+
+    @classmethod
+    def adjust(cls, user_id, changes):
+        '''Applies changed trackers to the summary of a user with a single UPDATE. Each
+        change is a (before, after) pair of (status, watched_episodes), with None for a
+        tracker that was just added or deleted. Users get an empty summary when they
+        register, so the summary is only rebuilt here for the ones created otherwise.'''
+        deltas = Counter()
+        for before, after in changes:
+            for state, sign in ((before, -1), (after, 1)):
+                if state is not None:
+                    status, watched_episodes = state
+                    deltas[status.lower()] += sign
+                    deltas['episodes_watched'] += sign * watched_episodes
+        values = {getattr(cls, key): getattr(cls, key) + delta for key, delta in deltas.items() if delta}
+        if not values:
+            return
+        if not cls.query.filter_by(user_id=user_id).update(values, synchronize_session=False):
+            # Flush the tracker changes so that the rebuild counts them
+            db.session.flush()
+            cls.rebuild(user_id)
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64))
+    payload = db.Column(db.Text, default='{}')
+    status = db.Column(db.String(16), default='queued')
+    attempts = db.Column(db.Integer, default=0)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', status, run_at),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.name} ({self.status})>'
+
+
+def validate_progress(anime, watched_episodes, start_date, end_date):
+    '''Returns why the progress cannot be tracked for the anime, or None if it is valid.'''
+    if watched_episodes < 0:
+        return 'Watched episodes cannot be negative.'
+    if anime.total_episodes != 0 and watched_episodes > anime.total_episodes:
+        return f'Watched episodes cannot exceed {anime.total_episodes}.'
+    if start_date is not None and end_date is not None and start_date > end_date:
+        return 'Start date cannot be past end date.'
+    return None
 
 
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
\ No newline at end of file
+    '''Returns the user for the session, caching their columns for a short while so that
+    most requests do not need a query before the route runs.'''
+    cache = current_app.extensions['user_cache']
+    values = cache.get(id)
+    if values is None:
+        user = User.query.get(int(id))
+        if user is not None:
+            cache.set(id, {column.key: getattr(user, column.key) for column in User.__table__.columns},
+                current_app.config['USER_CACHE_TTL'])
+        return user
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def invalidate_user(mapper, connection, user):
+    '''Drops a user from the cache whenever their password or profile changes.'''
+    if has_app_context():
+        current_app.extensions['user_cache'].delete(str(user.id))
\ No newline at end of file
@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+
+from datetime import datetime
+from flask import abort
+from sqlalchemy import tuple_
+
+
+class KeysetPage(object):
+    '''A page of results fetched by keyset (cursor) pagination. The cursors are opaque
+    strings that point just past the last item or just before the first item.'''
+
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(key, direction):
+    '''Encodes the (timestamp, id) key of an item and the direction to page in.'''
+    payload = json.dumps([key[0].isoformat(), key[1], direction])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    '''Returns the key and direction of a cursor, or None if it is not valid.'''
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, id, direction = json.loads(payload)
+        key = (datetime.fromisoformat(timestamp), int(id))
+    except (binascii.Error, TypeError, ValueError):
+        return None
+    # Ids past the range of a 64-bit integer would fail in the database instead
+    if direction not in ('next', 'prev') or not -2 ** 63 <= key[1] < 2 ** 63:
+        return None
+    return key, direction
+
+
+def paginate_keyset(query, columns, cursor, per_page):
+    '''Returns a page of the query in descending order of the (timestamp, id) columns.
+    Rather than counting and skipping rows with OFFSET, the page seeks to the cursor
+    position, so every page costs the same no matter how deep it is. Aborts with a 400
+    if the cursor is not valid.'''
+    timestamp, id = columns
+    decoded = decode_cursor(cursor) if cursor else None
+    if cursor and decoded is None:
+        abort(400)
+    if decoded is None:
+        items = query.order_by(timestamp.desc(), id.desc()).limit(per_page + 1).all()
+        has_more, has_prev = len(items) > per_page, False
+        items = items[:per_page]
+    else:
+        key, direction = decoded
+        if direction == 'next':
+            items = query.filter(tuple_(timestamp, id) < key) \
+                .order_by(timestamp.desc(), id.desc()).limit(per_page + 1).all()
+            has_more, has_prev = len(items) > per_page, True
+            items = items[:per_page]
+        else:
+            items = query.filter(tuple_(timestamp, id) > key) \
+                .order_by(timestamp.asc(), id.asc()).limit(per_page + 1).all()
+            has_more, has_prev = True, len(items) > per_page
+            items = items[:per_page][::-1]
+    next_cursor = prev_cursor = None
+    if items and has_more:
+        next_cursor = encode_cursor((getattr(items[-1], timestamp.key), getattr(items[-1], id.key)), 'next')
+    if items and has_prev:
+        prev_cursor = encode_cursor((getattr(items[0], timestamp.key), getattr(items[0], id.key)), 'prev')
+    return KeysetPage(items, next_cursor, prev_cursor)
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class TokenBucket(object):
+    '''Thread-safe token bucket that refills at rate tokens per second up to capacity.'''
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        '''Takes a token if one is available, otherwise returns how many seconds it will
+        take for one to be. Returns 0 when a token was taken.'''
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        '''Puts back a token taken for something that did not happen after all.'''
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class Limiter(object):
+    '''Token buckets per key, taken from with hit() and given back with refund().'''
+
+    def hit(self, key):
+        raise NotImplementedError
+
+    def refund(self, key):
+        raise NotImplementedError
+
+    def acquire(self, key, timeout=None):
+        '''Waits for a token from the bucket of the key, giving up after timeout seconds.
+        Returns whether a token was taken.'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.hit(key)
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class MemoryLimiter(Limiter):
+    '''Token buckets per key, kept in process memory, so each process has buckets of its
+    own. Only the maxsize most recently used keys are kept, which forgets idle buckets
+    that would be full again anyway.'''
+
+    def __init__(self, rate, capacity, maxsize=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        '''Takes a token from the bucket of the key. Returns 0 if one was taken, otherwise
+        how many seconds it will take for one to be available.'''
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+                if len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        return bucket.try_acquire()
+
+    def refund(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+        # A forgotten bucket is full again, so there is nothing to give back to
+        if bucket is not None:
+            bucket.refund()
+
+
+class RedisLimiter(Limiter):
+    '''Token buckets per key, kept in Redis so that every process shares them. Each bucket
+    is a hash updated atomically by a script, and expires once it would be full again.'''
+
+    SCRIPT = '''
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, capacity, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens, updated = tonumber(bucket[1]), tonumber(bucket[2])
+if tokens == nil then
+    tokens, updated = capacity, now
+end
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+'''
+
+    REFUND_SCRIPT = '''
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens ~= nil then
+    redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[1]), tokens + 1))
+end
+'''
+
+    def __init__(self, rate, capacity, url, prefix='ratelimit:'):
+        if redis is None:
+            raise RuntimeError('The redis package is required for the redis rate limiter backend.')
+        self.rate = rate
+        self.capacity = capacity
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+        self.refund_script = self.client.register_script(self.REFUND_SCRIPT)
+
+    def hit(self, key):
+        return float(self.script(keys=[self.prefix + key],
+            args=[self.rate, self.capacity, time.time()]))
+
+    def refund(self, key):
+        self.refund_script(keys=[self.prefix + key], args=[self.capacity])
+
+
+def make_limiter(backend, rate, capacity, url=None):
+    '''Returns a rate limiter for the configured backend: memory or redis.'''
+    if backend == 'memory':
+        return MemoryLimiter(rate, capacity)
+    if backend == 'redis':
+        return RedisLimiter(rate, capacity, url or 'redis://localhost:6379/0')
+    raise ValueError(f'Unknown rate limiter backend: {backend}')
+
+
+class SearchLimiter(object):
+    '''Limits how often searches can go to MyAnimeList, both for each user and for
+    everyone at once, so that traffic spikes cannot push the API over its quota.
+    Searches answered from the local catalog or the MyAnimeList cache are not limited.'''
+
+    def __init__(self, app=None):
+        self.user = None
+        self.everyone = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend, url = app.config['RATE_LIMIT_BACKEND'], app.config['RATE_LIMIT_URL']
+        self.user = make_limiter(backend, app.config['SEARCH_USER_RATE'],
+            app.config['SEARCH_USER_BURST'], url)
+        self.everyone = make_limiter(backend, app.config['SEARCH_GLOBAL_RATE'],
+            app.config['SEARCH_GLOBAL_BURST'], url)
+        app.extensions['search_limiter'] = self
+
+    def hit(self, user_id):
+        '''Returns 0 if the user may search now, otherwise how many seconds to wait. A
+        search turned down by the global limit does not count against the user.'''
+        key = f'search:user:{user_id}'
+        wait = self.user.hit(key)
+        if wait:
+            return wait
+        wait = self.everyone.hit('search:global')
+        if wait:
+            self.user.refund(key)
+        return wait
@@ -0,0 +1,85 @@
+import difflib
+import re
+
+from app import db
+from app.models import Anime
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(q):
+    return [token.lower() for token in WORD.findall(q)]
+
+
+def correct(tokens):
+    '''Returns the closest terms of the SQLite full-text index for each token, so that a
+    misspelled query can still match.'''
+    corrections = []
+    for token in tokens:
+        terms = [term for term, in db.session.execute(text('SELECT term FROM anime_fts_vocab '
+            'WHERE term >= :start AND term < :end'), {'start': token[0], 'end': chr(ord(token[0]) + 1)})]
+        corrections.append(difflib.get_close_matches(token, terms, n=3, cutoff=0.75) or [token])
+    return corrections
+
+
+def match_sqlite(tokens, limit, offset):
+    '''Matches titles with the FTS5 index, treating every token as a prefix. If nothing
+    matches at all, every token is swapped for the indexed terms closest to it, on every
+    page so that the pages of a corrected query follow on from each other.'''
+    query = 'SELECT rowid FROM anime_fts WHERE anime_fts MATCH :match ORDER BY rank ' \
+        'LIMIT :limit OFFSET :offset'
+    match = ' AND '.join(f'"{token}"*' for token in tokens)
+    ids = [id for id, in db.session.execute(text(query),
+        {'match': match, 'limit': limit, 'offset': offset})]
+    # An empty later page may just be the end of the exact matches
+    if not ids and (offset == 0 or not db.session.execute(text(query),
+            {'match': match, 'limit': 1, 'offset': 0}).first()):
+        match = ' AND '.join('(' + ' OR '.join(f'"{term}"' for term in terms) + ')'
+            for terms in correct(tokens))
+        ids = [id for id, in db.session.execute(text(query),
+            {'match': match, 'limit': limit, 'offset': offset})]
+    return ids
+
+
+def match_postgresql(tokens, q, limit, offset):
+    '''Matches titles by prefix with the tsvector index, or by trigram similarity to
+    tolerate typos, best matches first. Both are part of the same query, so every page
+    of a misspelled query is matched the same way as the first one.'''
+    query = text("SELECT id FROM anime WHERE to_tsvector('simple', title) @@ "
+        "to_tsquery('simple', :match) OR title % :q "
+        'ORDER BY similarity(title, :q) DESC, id LIMIT :limit OFFSET :offset')
+    match = ' & '.join(f'{token}:*' for token in tokens)
+    return [id for id, in db.session.execute(query,
+        {'match': match, 'q': q, 'limit': limit, 'offset': offset})]
+
+
+def match_like(tokens, limit, offset):
+    query = Anime.query.with_entities(Anime.id)
+    for token in tokens:
+        query = query.filter(Anime.title.ilike(f'%{token}%'))
+    return [id for id, in query.order_by(Anime.title).limit(limit).offset(offset)]
+
+
+def search_local(q, limit, offset=0):
+    '''Returns the animes of the local catalog matching a query, best matches first, and
+    whether there are more of them. Uses the full-text index of the database when there
+    is one, falling back to a LIKE scan otherwise.'''
+    tokens = tokenize(q)
+    if not tokens:
+        return [], False
+    dialect = db.engine.dialect.name
+    try:
+        if dialect == 'sqlite':
+            ids = match_sqlite(tokens, limit + 1, offset)
+        elif dialect == 'postgresql':
+            ids = match_postgresql(tokens, q, limit + 1, offset)
+        else:
+            ids = match_like(tokens, limit + 1, offset)
+    except (OperationalError, ProgrammingError):
+        # The full-text index has not been created, as with db.create_all()
+        db.session.rollback()
+        ids = match_like(tokens, limit + 1, offset)
+    animes = {anime.id: anime for anime in Anime.query.filter(Anime.id.in_(ids[:limit]))}
+    return [animes[id] for id in ids[:limit] if id in animes], len(ids) > limit
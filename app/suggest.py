@@ -0,0 +1,94 @@
+import bisect
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func
+
+
+class TitleIndex(object):
+    '''In-memory index of anime titles for autocompletion. Titles are kept in a sorted
+    array and looked up by prefix with bisect, so suggestions never touch the database.
+    The index holds at most maxsize titles, preferring the most tracked ones, and is
+    rebuilt from the database every rebuild_interval seconds to pick up the titles
+    added by other processes. Rebuilds run in a background thread, so requests are
+    always served from the old index, or an empty one until the first build is done.'''
+
+    def __init__(self, maxsize=100000, rebuild_interval=600):
+        self.maxsize = maxsize
+        self.rebuild_interval = rebuild_interval
+        self.keys = []
+        self.titles = []
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.maxsize = app.config['SUGGEST_MAX_TITLES']
+        self.rebuild_interval = app.config['SUGGEST_REBUILD_INTERVAL']
+        app.extensions['suggestions'] = self
+
+    def build(self):
+        '''Loads the most tracked titles of the catalog, up to the size limit.'''
+        from app import db
+        from app.models import Anime, Tracker
+        trackers = func.count(Tracker.id)
+        query = db.session.query(Anime.title).outerjoin(Tracker) \
+            .group_by(Anime.id, Anime.title).order_by(trackers.desc()).limit(self.maxsize)
+        entries = sorted({(title.lower(), title) for title, in query if title})
+        with self._lock:
+            self.keys = [key for key, _ in entries]
+            self.titles = [title for _, title in entries]
+            self.built_at = time.monotonic()
+
+    def add(self, titles):
+        '''Adds new titles to the index while there is room for them.'''
+        with self._lock:
+            for title in titles:
+                key = title.lower()
+                index = bisect.bisect_left(self.keys, key)
+                if len(self.keys) >= self.maxsize:
+                    break
+                if index < len(self.keys) and self.keys[index] == key:
+                    continue
+                self.keys.insert(index, key)
+                self.titles.insert(index, title)
+
+    def stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > self.rebuild_interval
+
+    def refresh(self):
+        '''Starts rebuilding the index in a background thread, unless a rebuild is already
+        running. Never waits for the build, even when there is no index yet.'''
+        if not self._build_lock.acquire(blocking=False):
+            return
+        app = current_app._get_current_object()
+        self._thread = threading.Thread(target=self._rebuild, args=(app,),
+                                        name='suggest', daemon=True)
+        self._thread.start()
+
+    def _rebuild(self, app):
+        try:
+            with app.app_context():
+                # A previous rebuild may have finished since the index was found stale
+                if self.stale():
+                    self.build()
+        except Exception:
+            app.logger.exception('Could not rebuild the title index')
+        finally:
+            self._build_lock.release()
+
+    def suggest(self, prefix, limit=10):
+        '''Returns up to limit titles starting with the prefix, in alphabetical order.'''
+        if self.stale():
+            self.refresh()
+        prefix = prefix.lower()
+        with self._lock:
+            index = bisect.bisect_left(self.keys, prefix)
+            suggestions = []
+            while index < len(self.keys) and len(suggestions) < limit \
+                    and self.keys[index].startswith(prefix):
+                suggestions.append(self.titles[index])
+                index += 1
+        return suggestions
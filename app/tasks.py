@@ -0,0 +1,54 @@
+from app import db, mal
+from app.jobs import enqueue, job
+from app.models import Anime, Tracker
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_
+
+
+@job('enrich_anime')
+def enrich_anime(mal_ids, refresh=False):
+    '''Fills in the episode counts and images of animes that came back incomplete from a
+    search, or refetches them when refreshing. Fails, and so gets retried, if any of the
+    animes could not be fetched.'''
+    details, _ = mal.get_details(mal_ids, refresh=refresh)
+    details = {id: detail for id, detail in zip(mal_ids, details) if detail is not None}
+    now = datetime.utcnow()
+    for anime in Anime.query.filter(Anime.mal_id.in_(list(details))):
+        detail = details[anime.mal_id]
+        anime.title = detail['title'][:100]
+        anime.image_url = detail['image_url']
+        anime.total_episodes = detail['total_episodes']
+        anime.airing_status = detail.get('airing_status')
+        anime.last_fetched_at = now
+    db.session.commit()
+    failed = [id for id in mal_ids if id not in details]
+    if failed:
+        raise RuntimeError(f'Could not fetch the details of animes {failed}')
+
+
+def stale_animes(limit):
+    '''Returns the MyAnimeList ids of the tracked animes most in need of a refresh: the
+    ones still airing, not aired yet or with an unknown episode count, that have not
+    been fetched recently, least recently fetched first.'''
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['CATALOG_REFRESH_AGE'])
+    tracked = db.session.query(Tracker.id).filter(Tracker.anime_id == Anime.id).exists()
+    query = db.session.query(Anime.mal_id).filter(
+        Anime.mal_id.isnot(None), tracked,
+        or_(Anime.airing_status.is_(None), Anime.airing_status != 'finished_airing',
+            Anime.total_episodes == 0),
+        or_(Anime.last_fetched_at.is_(None), Anime.last_fetched_at < cutoff)
+    ).order_by(Anime.last_fetched_at.isnot(None), Anime.last_fetched_at).limit(limit)
+    return [mal_id for mal_id, in query]
+
+
+@job('refresh_catalog', every='CATALOG_REFRESH_INTERVAL')
+def refresh_catalog():
+    '''Enqueues refreshes of the stalest tracked animes in batches. The batches go
+    through the MAL rate limiter like any other upstream call.'''
+    mal_ids = stale_animes(current_app.config['CATALOG_REFRESH_LIMIT'])
+    batch_size = current_app.config['CATALOG_REFRESH_BATCH']
+    for start in range(0, len(mal_ids), batch_size):
+        enqueue('enrich_anime', mal_ids=mal_ids[start:start + batch_size], refresh=True)
+    db.session.commit()
+    return len(mal_ids)
@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+
+from app import db
+from app.jobs import enqueue
+from app.models import STATUSES, Anime, Tracker, UserStats, validate_progress
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import joinedload
+from xml.etree.ElementTree import iterparse
+
+CSV_FIELDS = ['mal_id', 'title', 'total_episodes', 'watched_episodes', 'start_date',
+    'end_date', 'status']
+MAL_STATUSES = {
+    'Watching': 'Watching',
+    'Completed': 'Completed',
+    'On-Hold': 'Holding',
+    'Dropped': 'Dropped',
+    'Plan to Watch': 'Planning'
+}
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        # MyAnimeList writes unknown dates as 0000-00-00
+        return None
+
+
+def iter_mal_xml(stream):
+    '''Yields the entries of a MyAnimeList XML export one at a time, discarding each
+    element once read so that memory use does not grow with the size of the list.'''
+    root = None
+    for event, element in iterparse(stream, events=('start', 'end')):
+        if root is None:
+            root = element
+        if event != 'end' or element.tag != 'anime':
+            continue
+        yield {
+            'mal_id': parse_int(element.findtext('series_animedb_id')),
+            'title': (element.findtext('series_title') or '').strip(),
+            'total_episodes': parse_int(element.findtext('series_episodes')) or 0,
+            'watched_episodes': parse_int(element.findtext('my_watched_episodes')) or 0,
+            'start_date': parse_date(element.findtext('my_start_date')),
+            'end_date': parse_date(element.findtext('my_finish_date')),
+            'status': MAL_STATUSES.get(element.findtext('my_status'))
+        }
+        root.clear()
+
+
+def iter_csv(stream):
+    '''Yields the rows of a CSV file with the same columns as the CSV export.'''
+    for row in csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')):
+        yield {
+            'mal_id': parse_int(row.get('mal_id')),
+            'title': (row.get('title') or '').strip(),
+            'total_episodes': parse_int(row.get('total_episodes')) or 0,
+            'watched_episodes': parse_int(row.get('watched_episodes')) or 0,
+            'start_date': parse_date(row.get('start_date')),
+            'end_date': parse_date(row.get('end_date')),
+            'status': row.get('status') if row.get('status') in STATUSES else None
+        }
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def resolve_animes(rows):
+    '''Returns the anime id of each row, or None for the rows that cannot be resolved.
+    Rows with a MyAnimeList id are upserted into the catalog in one batch, while rows
+    with only a title are matched against the catalog with a single query.'''
+    known = Anime.upsert_many([{'mal_id': row['mal_id'], 'title': row['title'],
+        'image_url': '', 'total_episodes': row['total_episodes'], 'complete': False}
+        for row in rows if row['mal_id'] is not None and row['title']])
+    by_mal_id = {anime.mal_id: anime.id for anime in known}
+    titles = [row['title'][:100] for row in rows if row['mal_id'] is None and row['title']]
+    by_title = dict(db.session.query(Anime.title, Anime.id).filter(Anime.title.in_(titles))) \
+        if titles else {}
+    return [by_mal_id.get(row['mal_id']) if row['mal_id'] is not None
+        else by_title.get(row['title'][:100]) for row in rows]
+
+
+def import_trackers(user_id, rows, chunk_size=500):
+    '''Adds trackers for the given rows to a user, a chunk at a time. Each chunk resolves
+    its animes in batches and is written with one bulk INSERT, skipping animes that the
+    user already tracks. Animes new to the catalog are queued to have their details filled
+    in, and the user's statistics are recomputed once in the same transaction. Returns
+    the number of trackers imported and rows skipped.'''
+    imported = skipped = 0
+    dialect = db.engine.dialect.name
+    batch_size = current_app.config['CATALOG_REFRESH_BATCH']
+    for chunk in chunked(rows, chunk_size):
+        anime_ids = resolve_animes(chunk)
+        animes = {anime.id: anime for anime in Anime.query.filter(
+            Anime.id.in_([id for id in anime_ids if id is not None]))}
+        trackers = {}
+        valid = 0
+        for row, anime_id in zip(chunk, anime_ids):
+            anime = animes.get(anime_id)
+            if anime is None or row['status'] is None or validate_progress(anime,
+                    row['watched_episodes'], row['start_date'], row['end_date']) is not None:
+                skipped += 1
+                continue
+            valid += 1
+            trackers[anime_id] = {
+                'user_id': user_id,
+                'anime_id': anime_id,
+                'watched_episodes': row['watched_episodes'],
+                'start_date': row['start_date'],
+                'end_date': row['end_date'],
+                'status': row['status'],
+                'timestamp': datetime.utcnow()
+            }
+        if trackers:
+            if dialect in ('postgresql', 'sqlite'):
+                insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+                statement = insert(Tracker.__table__).values(list(trackers.values())) \
+                    .on_conflict_do_nothing(index_elements=['user_id', 'anime_id'])
+            else:
+                statement = Tracker.__table__.insert().values(list(trackers.values()))
+            inserted = db.session.execute(statement).rowcount
+            imported += inserted
+            # Animes tracked twice in the file or already tracked by the user
+            skipped += valid - inserted
+        incomplete = [animes[id].mal_id for id in trackers
+            if animes[id].last_fetched_at is None and animes[id].mal_id is not None]
+        for start in range(0, len(incomplete), batch_size):
+            enqueue('enrich_anime', unique=True, mal_ids=incomplete[start:start + batch_size])
+    UserStats.rebuild(user_id)
+    db.session.commit()
+    return imported, skipped
+
+
+def iter_trackers(user_id):
+    '''Yields a user's trackers with their animes, loading them in batches.'''
+    return Tracker.query.filter_by(user_id=user_id).options(joinedload(Tracker.anime)) \
+        .order_by(Tracker.id).yield_per(1000)
+
+
+def export_row(tracker):
+    return {
+        'mal_id': tracker.anime.mal_id,
+        'title': tracker.anime.title,
+        'total_episodes': tracker.anime.total_episodes,
+        'watched_episodes': tracker.watched_episodes,
+        'start_date': tracker.start_date.isoformat() if tracker.start_date else '',
+        'end_date': tracker.end_date.isoformat() if tracker.end_date else '',
+        'status': tracker.status
+    }
+
+
+def export_csv(user_id):
+    '''Yields a user's trackers as CSV, one line at a time.'''
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for tracker in iter_trackers(user_id):
+        writer.writerow(export_row(tracker))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_json(user_id):
+    '''Yields a user's trackers as a JSON array, one item at a time.'''
+    separator = '['
+    for tracker in iter_trackers(user_id):
+        yield separator + json.dumps(tracker.to_dict())
+        separator = ','
+    yield '[]' if separator == '[' else ']'
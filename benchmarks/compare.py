@@ -0,0 +1,33 @@
+'''Compares two load-test reports written by benchmarks.load.
+
+    python -m benchmarks.compare before.json after.json'''
+import argparse
+import json
+
+
+def change(before, after):
+    if not before or after is None:
+        return ''
+    return f'{(after - before) / before * 100:+.0f}%'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before', type=argparse.FileType())
+    parser.add_argument('after', type=argparse.FileType())
+    args = parser.parse_args()
+    before, after = json.load(args.before), json.load(args.after)
+    print(f'before: {before["commit"]} ({before["created_at"]})')
+    print(f'after:  {after["commit"]} ({after["created_at"]})')
+    print(f'{"scenario":14}{"metric":12}{"before":>10}{"after":>10}{"change":>9}')
+    scenarios = dict(before['results']['scenarios'], **after['results']['scenarios'])
+    for name in sorted(scenarios):
+        old = before['results']['scenarios'].get(name, {})
+        new = after['results']['scenarios'].get(name, {})
+        for metric in ('p50', 'p95', 'p99', 'throughput', 'queries', 'errors'):
+            a, b = old.get(metric), new.get(metric)
+            print(f'{name:14}{metric:12}{"-" if a is None else a:>10}'
+                f'{"-" if b is None else b:>10}{change(a, b):>9}')
+            name = ''
+    a, b = before['results']['throughput'], after['results']['throughput']
+    print(f'{"total":14}{"throughput":12}{a:>10}{b:>10}{change(a, b):>9}')
@@ -0,0 +1,84 @@
+'''Generates a seeded dataset of users, animes and trackers for the load tests, in SQLite
+or PostgreSQL.
+
+    python -m benchmarks.dataset --scale medium --database-url postgresql://localhost/bench
+
+The database is migrated to the latest revision first. Every user is named user<n>
+with the password "password", and the same seed always generates the same dataset.'''
+import argparse
+import os
+import random
+import time
+
+from app import create_app, db
+from app.models import STATUSES, Anime, Tracker, User, UserStats
+from config import Config
+from datetime import datetime, timedelta
+from flask_migrate import upgrade
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+SCALES = {
+    'small': {'users': 100, 'trackers': 50, 'animes': 2000},
+    'medium': {'users': 1000, 'trackers': 200, 'animes': 20000},
+    'large': {'users': 10000, 'trackers': 500, 'animes': 50000},
+}
+WORDS = ['academia', 'attack', 'blade', 'bleach', 'clover', 'cowboy', 'demon', 'dragon',
+    'eden', 'fullmetal', 'gintama', 'hero', 'hunter', 'jujutsu', 'kaisen', 'magic', 'naruto',
+    'one', 'piece', 'punch', 'slayer', 'spirited', 'steins', 'titan', 'violet', 'zero']
+PASSWORD = 'password'
+
+
+def generate(users, trackers, animes, seed=0, words=WORDS, chunk_size=50000):
+    '''Inserts the users, animes and trackers with chunked bulk inserts and builds the
+    statistics of every user. Each user tracks the given number of distinct animes, and
+    the titles are made of up to three of the words.'''
+    rng = random.Random(seed)
+    # Hashing is deliberately slow, and every user has the same password anyway
+    password_hash = generate_password_hash(PASSWORD)
+    for start in range(0, users, chunk_size):
+        db.session.execute(insert(User), [{'username': f'user{n}', 'email': f'user{n}@example.com',
+            'password_hash': password_hash} for n in range(start, min(start + chunk_size, users))])
+    for start in range(0, animes, chunk_size):
+        db.session.execute(insert(Anime), [{'mal_id': n,
+            'title': ' '.join(rng.sample(words, min(len(words), 3))) + f' {n}', 'image_url': '',
+            'total_episodes': rng.choice([0, 12, 24, 26, 50]), 'airing_status': 'finished_airing',
+            'last_fetched_at': datetime.utcnow()} for n in range(start, min(start + chunk_size, animes))])
+    epoch = datetime(2020, 1, 1)
+    rows = []
+    for user_id in range(1, users + 1):
+        for anime_id in rng.sample(range(1, animes + 1), min(trackers, animes)):
+            rows.append({'user_id': user_id, 'anime_id': anime_id, 'watched_episodes': 0,
+                'status': rng.choice(STATUSES),
+                'timestamp': epoch + timedelta(seconds=rng.randrange(10 ** 8))})
+            if len(rows) == chunk_size:
+                db.session.execute(insert(Tracker), rows)
+                rows = []
+    if rows:
+        db.session.execute(insert(Tracker), rows)
+    UserStats.rebuild()
+    db.session.commit()
+
+
+def prepare(app, scale, seed=0):
+    '''Migrates the database of the app and fills it with the dataset of the given scale,
+    unless it already has users.'''
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+        if User.query.first() is None:
+            start = time.perf_counter()
+            generate(seed=seed, **SCALES[scale])
+            print(f'generated the {scale} dataset in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    class DatasetConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url
+
+    prepare(create_app(DatasetConfig), args.scale, args.seed)
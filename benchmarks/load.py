@@ -0,0 +1,282 @@
+'''Runs load-test scenarios against the app and reports latency percentiles, throughput
+and query counts as JSON.
+
+    python -m benchmarks.load --scale small --workers 8 --duration 30 --output before.json
+    python -m benchmarks.load --url http://127.0.0.1:5000 --users 100 --duration 30
+
+Without --url, the app is served in process from a generated dataset (see
+benchmarks.dataset) with a stub MAL server injecting --latency and --error-rate, and
+with instrumentation on so that query counts are read from its Server-Timing headers.
+With --url, a running server is tested instead. Its users must be the ones of the
+dataset, and query counts are only reported if it has INSTRUMENTATION_ENABLED.
+
+Every worker logs in as its own user and runs a weighted mix of the scenarios until
+the time is up. Reports of two runs are compared with benchmarks.compare.'''
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+
+import requests
+
+from app import create_app
+from app.models import STATUSES
+from benchmarks.dataset import PASSWORD, SCALES, WORDS, prepare
+from benchmarks.stub_mal import serve
+from collections import defaultdict
+from config import Config
+from datetime import datetime
+from html import unescape
+from werkzeug.serving import make_server
+
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+NEXT_URL = re.compile(r'class="next">\s*<a href="([^"#]+)"')
+QUERIES = re.compile(r'desc="(\d+) queries"')
+ANIME_ID = re.compile(r'/(\d+)/track')
+TRACKER_ID = re.compile(r'/tracker/(\d+)/edit')
+
+MIX = {
+    'login': 5,
+    'index': 30,
+    'index_page': 10,
+    'index_status': 15,
+    'search': 20,
+    'search_mal': 5,
+    'track': 5,
+    'edit': 10,
+}
+
+
+class Client(object):
+    '''A user of the app, recording the scenario, latency, status and query count of
+    every request it makes. Redirects are not followed, so each request is timed on
+    its own.'''
+
+    def __init__(self, base_url, username, results):
+        self.base_url = base_url
+        self.username = username
+        self.results = results
+        self.session = requests.Session()
+        self.csrf_token = None
+        self.next_url = None
+        self.anime_ids = []
+        self.tracker_ids = []
+
+    def request(self, scenario, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path,
+                allow_redirects=False, timeout=30, **kwargs)
+        except requests.RequestException:
+            self.results.append((scenario, time.perf_counter() - start, 0, None))
+            return None
+        elapsed = time.perf_counter() - start
+        match = QUERIES.search(response.headers.get('Server-Timing', ''))
+        self.results.append((scenario, elapsed, response.status_code,
+            int(match.group(1)) if match else None))
+        return response
+
+    def login(self):
+        self.session.cookies.clear()
+        response = self.session.get(self.base_url + '/auth/login', timeout=30)
+        match = CSRF_TOKEN.search(response.text)
+        # The token is tied to the session, so it is good for every form that follows
+        self.csrf_token = match.group(1) if match else None
+        return self.request('login', 'POST', '/auth/login', data={'username': self.username,
+            'password': PASSWORD, 'csrf_token': self.csrf_token})
+
+    def form(self, **data):
+        return dict(data, csrf_token=self.csrf_token)
+
+
+def login(client, rng):
+    client.login()
+
+
+def index(client, rng):
+    response = client.request('index', 'GET', '/index')
+    if response is not None and response.status_code == 200:
+        client.tracker_ids = TRACKER_ID.findall(response.text) or client.tracker_ids
+        match = NEXT_URL.search(response.text)
+        client.next_url = unescape(match.group(1)) if match else None
+
+
+def index_page(client, rng):
+    if client.next_url is None:
+        return index(client, rng)
+    response = client.request('index_page', 'GET', client.next_url)
+    match = NEXT_URL.search(response.text) if response is not None else None
+    client.next_url = unescape(match.group(1)) if match else None
+
+
+def index_status(client, rng):
+    client.request('index_status', 'GET', '/index', params={'status': rng.choice(STATUSES)})
+
+
+def search(client, rng):
+    response = client.request('search', 'GET', '/search', params={'q': rng.choice(WORDS)})
+    if response is not None and response.status_code == 200:
+        client.anime_ids = ANIME_ID.findall(response.text) or client.anime_ids
+
+
+def search_mal(client, rng):
+    q = ' '.join(rng.sample(WORDS, 2))
+    client.request('search_mal', 'GET', '/search', params={'q': q, 'source': 'mal'})
+
+
+def track(client, rng):
+    if not client.anime_ids:
+        return search(client, rng)
+    client.request('track', 'POST', f'/{rng.choice(client.anime_ids)}/track',
+        data=client.form(watched_episodes=0, status='Planning'))
+
+
+def edit(client, rng):
+    if not client.tracker_ids:
+        return index(client, rng)
+    client.request('edit', 'POST', f'/tracker/{rng.choice(client.tracker_ids)}/edit',
+        data=client.form(watched_episodes=0, status=rng.choice(STATUSES)))
+
+
+SCENARIOS = {
+    'login': login,
+    'index': index,
+    'index_page': index_page,
+    'index_status': index_status,
+    'search': search,
+    'search_mal': search_mal,
+    'track': track,
+    'edit': edit,
+}
+
+
+def percentile(values, fraction):
+    '''Returns the nearest-rank percentile of sorted values.'''
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def summarize(results, elapsed):
+    '''Returns the latency percentiles in milliseconds, throughput, errors and mean query
+    count of each scenario and of the run as a whole.'''
+    by_scenario = defaultdict(list)
+    for result in results:
+        by_scenario[result[0]].append(result)
+    scenarios = {}
+    for name, rows in sorted(by_scenario.items()):
+        latencies = sorted(latency * 1000 for _, latency, _, _ in rows)
+        queries = [count for _, _, _, count in rows if count is not None]
+        scenarios[name] = {
+            'requests': len(rows),
+            'errors': sum(1 for _, _, status, _ in rows if not 200 <= status < 400),
+            'throughput': round(len(rows) / elapsed, 2),
+            'p50': round(percentile(latencies, 0.5), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'queries': round(sum(queries) / len(queries), 2) if queries else None
+        }
+    return {
+        'requests': len(results),
+        'errors': sum(scenario['errors'] for scenario in scenarios.values()),
+        'throughput': round(len(results) / elapsed, 2),
+        'scenarios': scenarios
+    }
+
+
+def run(base_url, users, workers, duration, mix, seed=0):
+    '''Runs the scenarios from each worker for the given number of seconds and returns
+    the summary of the requests made within that time.'''
+    rng = random.Random(seed)
+    results = []
+    clients = [Client(base_url, f'user{n}', results) for n in rng.sample(range(users), workers)]
+    for client in clients:
+        client.login()
+        index(client, rng)
+        search(client, rng)
+    # Only measure the requests made once every worker is ready
+    del results[:]
+    names, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + duration
+
+    def work(client, rng):
+        while time.perf_counter() < deadline:
+            SCENARIOS[rng.choices(names, weights)[0]](client, rng)
+
+    threads = [threading.Thread(target=work, args=(client, random.Random(seed + n)))
+        for n, client in enumerate(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(results, time.perf_counter() - start)
+
+
+def serve_app(args):
+    '''Serves the app in process from a generated dataset and returns its url.'''
+    stub = serve(latency=args.latency, error_rate=args.error_rate)
+    database_url = args.database_url or \
+        f'sqlite:///{os.path.join(tempfile.mkdtemp(), "load.db")}'
+
+    class LoadConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        MAL_BASE_URL = stub.base_url
+        MAL_RATE_LIMIT = 1000
+        # Workers search far faster than people do, so only the global limit applies
+        SEARCH_USER_RATE = 1000
+        SEARCH_USER_BURST = 1000
+        INSTRUMENTATION_ENABLED = True
+
+    app = create_app(LoadConfig)
+    prepare(app, args.scale, args.seed)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.port}'
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='test a running server instead of an in-process one')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--database-url', help='database for the in-process server, '
+        'a temporary SQLite file by default')
+    parser.add_argument('--users', type=int, help='users in the dataset, '
+        'taken from --scale by default')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--scenarios', default=','.join(MIX),
+        help='comma separated scenarios to run, weighted as in the default mix')
+    parser.add_argument('--latency', type=float, default=0.1,
+        help='seconds the stub MAL server waits before answering')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+        help='fraction of stub MAL requests answered with a 500')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=argparse.FileType('w'), help='file to write the report to')
+    args = parser.parse_args()
+    mix = {name: MIX[name] for name in args.scenarios.split(',')}
+    base_url = args.url.rstrip('/') if args.url else serve_app(args)
+    users = args.users or SCALES[args.scale]['users']
+    report = {
+        'commit': commit(),
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'options': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': run(base_url, users, args.workers, args.duration, mix, args.seed)
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write(output + '\n')
+    print(output)
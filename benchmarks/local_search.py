@@ -0,0 +1,56 @@
+'''Compares the latency of answering a search from the local catalog with going to the
+MAL API, served by the stub server with an artificial latency.
+
+    python -m benchmarks.local_search --animes 50000 --latency 0.1'''
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from app import create_app, mal
+from app.search import search_local
+from benchmarks.dataset import generate
+from benchmarks.stub_mal import serve
+from config import Config
+from flask_migrate import upgrade
+
+
+def median_ms(f, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        f()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--animes', type=int, default=50000)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    server = serve(latency=args.latency)
+    path = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        MAL_BASE_URL = server.base_url
+        MAL_CACHE_BACKEND = 'none'
+        MAL_RATE_LIMIT = 1000
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+        generate(0, 0, args.animes)
+        per_page = app.config['ANIMES_PER_PAGE']
+        results = {
+            'local (exact)': median_ms(lambda: search_local('naruto', per_page), args.rounds),
+            'local (prefix)': median_ms(lambda: search_local('nar tit', per_page), args.rounds),
+            'local (typo)': median_ms(lambda: search_local('narutp', per_page), args.rounds),
+            'upstream': median_ms(lambda: mal.search('naruto', 0), args.rounds),
+        }
+    print(f'{args.animes} animes in the catalog, {args.latency * 1000:.0f}ms upstream latency')
+    for name, latency in results.items():
+        print(f'{name:16}{latency:10.2f}ms')
@@ -0,0 +1,68 @@
+'''Compares the latency of the tracker list and search pages with and without the
+fragment cache for the per-anime parts of each row.
+
+    python -m benchmarks.render_pages --per-page 50 --rounds 50
+
+Both pages are served from a seeded SQLite database with the same page size, so the
+difference between the two runs is the cost of rendering the cached fragments.'''
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from app import create_app
+from benchmarks.dataset import generate
+from config import Config
+from flask_migrate import upgrade
+
+
+def measure(client, urls, rounds):
+    '''Returns the median latency in milliseconds of each url, after one warm-up request.'''
+    results = {}
+    for name, url in urls.items():
+        assert client.get(url).status_code == 200
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.status_code
+        results[name] = statistics.median(timings)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+    path = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    urls = {'index': '/index', 'search': '/search?q=naruto'}
+    results = {}
+    for name, size in (('uncached', 0), ('cached', 5000)):
+
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+            TRACKERS_PER_PAGE = args.per_page
+            ANIMES_PER_PAGE = args.per_page
+            FRAGMENT_CACHE_SIZE = size
+            # Time the pages rather than the rate limiter
+            SEARCH_USER_RATE = SEARCH_GLOBAL_RATE = 1000
+            SEARCH_USER_BURST = SEARCH_GLOBAL_BURST = 1000
+
+        app = create_app(BenchmarkConfig)
+        if name == 'uncached':
+            with app.app_context():
+                upgrade(directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+                # One user tracking a page of animes whose titles all match the search
+                generate(1, args.per_page, args.per_page, words=['naruto'])
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = '1'
+            session['_fresh'] = True
+        results[name] = measure(client, urls, args.rounds)
+    print(f'{args.per_page} rows per page')
+    print(f'{"page":12}{"uncached":>12}{"cached":>12}')
+    for name in urls:
+        print(f'{name:12}{results["uncached"][name]:10.2f}ms{results["cached"][name]:10.2f}ms')
@@ -0,0 +1,49 @@
+'''Measures the latency of a MAL search page against the stub server, comparing
+serial detail lookups with the concurrent fan-out.
+
+Nodes come back from the search call with their details, so detail lookups only
+happen for incomplete nodes; --missing-rate controls how many of those there are.
+
+    python -m benchmarks.search_fanout --latency 0.1 --rounds 5 --missing-rate 1'''
+import argparse
+import time
+
+from app import create_app, mal
+from benchmarks.stub_mal import serve
+from config import Config
+
+
+def time_searches(app, max_workers, rounds):
+    app.config['MAL_MAX_WORKERS'] = max_workers
+    mal.init_app(app)
+    timings = []
+    calls = 0
+    for n in range(rounds):
+        start = time.perf_counter()
+        data = mal.search(f'benchmark {n}', 0)
+        timings.append(time.perf_counter() - start)
+        assert data is not None and len(data['animes']) == app.config['ANIMES_PER_PAGE']
+        calls += data['upstream_calls']
+    return sum(timings) / len(timings), calls / rounds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--missing-rate', type=float, default=1.0)
+    args = parser.parse_args()
+    server = serve(latency=args.latency, missing_rate=args.missing_rate)
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        MAL_BASE_URL = server.base_url
+        MAL_ENRICH_ASYNC = False
+        MAL_RATE_LIMIT = 1000
+
+    app = create_app(BenchmarkConfig)
+    print(f'upstream latency: {args.latency * 1000:.0f}ms per request')
+    for name, max_workers in (('serial', 1), ('concurrent', Config.MAL_MAX_WORKERS)):
+        latency, calls = time_searches(app, max_workers, args.rounds)
+        print(f'{name + ":":12}{latency * 1000:8.1f}ms per search, '
+            f'{calls:.1f} upstream calls per search')
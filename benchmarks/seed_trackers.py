@@ -0,0 +1,94 @@
+'''Seeds a SQLite database with a large number of trackers and reports the latency of
+the tracker routes with and without the tracker indexes.
+
+    python -m benchmarks.seed_trackers --trackers 1000000 --rounds 20
+
+The database is migrated to the latest revision, seeded, and then measured twice:
+first after dropping the indexes of the tracker table and then once they are created
+again.'''
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from app import create_app, db
+from app.models import Tracker
+from benchmarks.dataset import generate
+from config import Config
+from flask_migrate import upgrade
+
+INDEXES = ['ix_tracker_user_id_anime_id', 'ix_tracker_user_id_status_timestamp',
+    'ix_tracker_user_id_timestamp', 'ix_tracker_anime_id']
+
+
+def measure(client, urls, rounds):
+    '''Returns the median latency in milliseconds of each url, after one warm-up request.'''
+    results = {}
+    for name, url in urls.items():
+        assert client.get(url).status_code == 200
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.status_code
+        results[name] = statistics.median(timings)
+    return results
+
+
+def deep_cursor_url(client, pages):
+    '''Follows the next links of the tracker list and returns the url of a deep page.'''
+    url = '/index'
+    for _ in range(pages):
+        response = client.get(url)
+        marker = response.data.find(b'/index?cursor=', response.data.find(b'class="next"'))
+        if marker == -1:
+            break
+        url = response.data[marker:response.data.find(b'"', marker)].decode().replace('&amp;', '&')
+    return url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--trackers', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--animes', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    path = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        WTF_CSRF_ENABLED = False
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+        start = time.perf_counter()
+        generate(args.users, max(args.trackers // args.users, 1), args.animes)
+        print(f'seeded {Tracker.query.count()} trackers in {time.perf_counter() - start:.1f}s')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    urls = {
+        'index': '/index',
+        'index (status)': '/index?status=Completed',
+        'index (page 20)': deep_cursor_url(client, 20),
+    }
+    with app.app_context():
+        # Measure without the indexes first, so that the baseline does not run on caches
+        # warmed up by the other run
+        for index in INDEXES:
+            db.session.execute(f'DROP INDEX {index}')
+        db.session.commit()
+        results = {'before': measure(client, urls, args.rounds)}
+        for index in Tracker.__table__.indexes:
+            if index.name in INDEXES:
+                index.create(db.engine)
+        results['after'] = measure(client, urls, args.rounds)
+    print(f'{"route":20}{"before":>12}{"after":>12}')
+    for name in urls:
+        print(f'{name:20}{results["before"][name]:10.2f}ms{results["after"][name]:10.2f}ms')
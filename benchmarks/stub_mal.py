@@ -0,0 +1,160 @@
+'''A local stand-in for the MyAnimeList API used by the benchmarks.
+
+Serves /v2/anime (search) and /v2/anime/<id> (details) with a deterministic catalog,
+and the cover art of the catalog under /images, with an artificial per-request
+latency, so that upstream behaviour can be measured without touching the real API.
+
+    python benchmarks/stub_mal.py --port 8081 --latency 0.1
+
+Point the app at it with MAL_BASE_URL=http://127.0.0.1:8081/v2/anime.'''
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+RESULTS_PER_QUERY = 50
+IMAGE_SIZE = 20 * 1024
+
+
+def make_catalog(q, host='https://cdn.example.com'):
+    '''Returns the deterministic list of animes matching a search query, with cover art
+    served by the given host.'''
+    seed = zlib.crc32(q.lower().encode()) % 100000
+    rng = random.Random(seed)
+    return [{
+        'id': seed * 1000 + n,
+        'title': f'{q.title()} {n + 1}',
+        'main_picture': {
+            'medium': f'{host}/images/anime/{seed}/{n}.jpg',
+            'large': f'{host}/images/anime/{seed}/{n}l.jpg'
+        },
+        'num_episodes': rng.choice([0, 12, 13, 24, 25, 26, 50, 64, 220]),
+        'status': rng.choice(['finished_airing', 'finished_airing', 'currently_airing',
+            'not_yet_aired'])
+    } for n in range(RESULTS_PER_QUERY)]
+
+
+class StubMALHandler(BaseHTTPRequestHandler):
+    # Keep connections alive between requests, as the real API does, without waiting on
+    # delayed ACKs between the headers and the body
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        server.count_request()
+        url = urlparse(self.path)
+        args = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if random.random() < server.error_rate:
+            return self.send_json(500, {'error': 'injected'})
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['v2', 'anime']:
+            return self.search(url, args)
+        if len(parts) == 3 and parts[:2] == ['v2', 'anime'] and parts[2].isdigit():
+            return self.details(int(parts[2]))
+        if parts[:1] == ['images']:
+            return self.image(url.path)
+        return self.send_json(404, {'error': 'not_found'})
+
+    def search(self, url, args):
+        q = args.get('q', '')
+        if len(q) < 3:
+            return self.send_json(400, {'error': 'invalid_parameters'})
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', 100))
+        catalog = make_catalog(q, f'http://{self.headers["Host"]}')
+        for anime in catalog:
+            self.server.animes[anime['id']] = anime
+        fields = args.get('fields', '').split(',')
+        data = []
+        for anime in catalog[offset:offset + limit]:
+            node = {key: anime[key] for key in ('id', 'title', 'main_picture')}
+            if random.random() >= self.server.missing_rate:
+                node.update({field: anime[field] for field in ('num_episodes', 'status')
+                    if field in fields})
+            data.append({'node': node})
+        paging = {}
+        base = f'http://{self.headers["Host"]}{url.path}'
+        if offset + limit < len(catalog):
+            paging['next'] = f'{base}?{urlencode({"q": q, "offset": offset + limit, "limit": limit})}'
+        if offset > 0:
+            paging['previous'] = f'{base}?{urlencode({"q": q, "offset": max(offset - limit, 0), "limit": limit})}'
+        self.send_json(200, {'data': data, 'paging': paging})
+
+    def details(self, id):
+        anime = self.server.animes.get(id)
+        if anime is None:
+            return self.send_json(404, {'error': 'not_found'})
+        self.send_json(200, anime)
+
+    def image(self, path):
+        '''Sends deterministic bytes standing in for a JPEG image.'''
+        payload = random.Random(path).randbytes(IMAGE_SIZE)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StubMALServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, missing_rate=0.0):
+        super(StubMALServer, self).__init__(address, StubMALHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.animes = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v2/anime'
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+
+def serve(port=0, latency=0.0, error_rate=0.0, missing_rate=0.0):
+    '''Starts a stub server on a background thread and returns it.'''
+    server = StubMALServer(('127.0.0.1', port), latency=latency, error_rate=error_rate,
+        missing_rate=missing_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.1,
+        help='seconds to wait before answering each request')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+        help='fraction of requests answered with a 500')
+    parser.add_argument('--missing-rate', type=float, default=0.0,
+        help='fraction of search nodes returned without their requested fields')
+    args = parser.parse_args()
+    server = StubMALServer(('127.0.0.1', args.port), latency=args.latency,
+        error_rate=args.error_rate, missing_rate=args.missing_rate)
+    print(f'Stub MAL API listening on {server.base_url}')
+    server.serve_forever()
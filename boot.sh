@@ -8,5 +8,4 @@ while true; do
     echo Upgrade command failed, retrying in 5 secs...
     sleep 5
 done
-flask translate compile
-exec gunicorn -b :5000 --access-logfile - --error-logfile - animetracker:app
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py animetracker:app
\ No newline at end of file
@@ -5,11 +5,86 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'))
 
 
+def engine_options(database_url):
+    '''Returns the connection pool settings of the database, sized to the number of
+    requests each worker process serves at once with the settings of gunicorn.conf.py.'''
+    if not database_url or database_url.startswith('sqlite'):
+        return {}
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'gthread'
+    if worker_class == 'gevent':
+        concurrency = int(os.environ.get('GUNICORN_CONNECTIONS') or 100)
+    elif worker_class == 'gthread':
+        concurrency = int(os.environ.get('GUNICORN_THREADS') or 4)
+    else:
+        concurrency = 1
+    # Most gevent requests are waiting on MyAnimeList rather than the database, so they
+    # share a smaller pool than one connection each
+    pool_size = int(os.environ.get('DATABASE_POOL_SIZE') or min(concurrency, 10))
+    max_overflow = int(os.environ.get('DATABASE_MAX_OVERFLOW') or max(min(concurrency, 30) - pool_size, 0))
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': 10,
+        'pool_pre_ping': True,
+        'pool_recycle': 30 * 60
+    }
+
+
 class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1000)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
     MAL_BASE_URL = os.environ.get('MAL_BASE_URL')
     MAL_HEADERS = {'X-MAL-CLIENT-ID': os.environ.get('MAL_CLIENT_ID')}
+    MAL_MAX_WORKERS = int(os.environ.get('MAL_MAX_WORKERS') or 10)
+    MAL_CONNECT_TIMEOUT = float(os.environ.get('MAL_CONNECT_TIMEOUT') or 3.05)
+    MAL_REQUEST_TIMEOUT = float(os.environ.get('MAL_REQUEST_TIMEOUT') or 5)
+    MAL_RETRIES = int(os.environ.get('MAL_RETRIES') or 2)
+    MAL_RETRY_BACKOFF = float(os.environ.get('MAL_RETRY_BACKOFF') or 0.25)
+    MAL_BREAKER_THRESHOLD = int(os.environ.get('MAL_BREAKER_THRESHOLD') or 5)
+    MAL_BREAKER_RESET = float(os.environ.get('MAL_BREAKER_RESET') or 30)
+    MAL_SEARCH_DEADLINE = float(os.environ.get('MAL_SEARCH_DEADLINE') or 8)
+    MAL_CACHE_BACKEND = os.environ.get('MAL_CACHE_BACKEND') or 'memory'
+    MAL_CACHE_URL = os.environ.get('MAL_CACHE_URL')
+    MAL_CACHE_SIZE = int(os.environ.get('MAL_CACHE_SIZE') or 10000)
+    MAL_SEARCH_TTL = int(os.environ.get('MAL_SEARCH_TTL') or 60 * 60)
+    MAL_DETAIL_TTL = int(os.environ.get('MAL_DETAIL_TTL') or 24 * 60 * 60)
+    # Rate limits are shared by every process with the redis backend, while the memory
+    # one applies them to each process on its own
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND') or 'memory'
+    RATE_LIMIT_URL = os.environ.get('RATE_LIMIT_URL')
+    MAL_RATE_LIMIT = float(os.environ.get('MAL_RATE_LIMIT') or 5)
+    MAL_RATE_BURST = int(os.environ.get('MAL_RATE_BURST') or 20)
+    MAL_ENRICH_ASYNC = os.environ.get('MAL_ENRICH_ASYNC', 'true').lower() == 'true'
+    CATALOG_REFRESH_INTERVAL = int(os.environ.get('CATALOG_REFRESH_INTERVAL') or 60 * 60)
+    CATALOG_REFRESH_AGE = int(os.environ.get('CATALOG_REFRESH_AGE') or 24 * 60 * 60)
+    CATALOG_REFRESH_LIMIT = int(os.environ.get('CATALOG_REFRESH_LIMIT') or 500)
+    CATALOG_REFRESH_BATCH = int(os.environ.get('CATALOG_REFRESH_BATCH') or 20)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 5)
+    JOB_BACKOFF = int(os.environ.get('JOB_BACKOFF') or 10)
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT') or 10 * 60)
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL') or 1)
     ANIMES_PER_PAGE = 10
-    TRACKERS_PER_PAGE = 10
\ No newline at end of file
+    SEARCH_USER_RATE = float(os.environ.get('SEARCH_USER_RATE') or 1)
+    SEARCH_USER_BURST = int(os.environ.get('SEARCH_USER_BURST') or 10)
+    SEARCH_GLOBAL_RATE = float(os.environ.get('SEARCH_GLOBAL_RATE') or 50)
+    SEARCH_GLOBAL_BURST = int(os.environ.get('SEARCH_GLOBAL_BURST') or 200)
+    SUGGEST_MAX_TITLES = int(os.environ.get('SUGGEST_MAX_TITLES') or 100000)
+    SUGGEST_REBUILD_INTERVAL = int(os.environ.get('SUGGEST_REBUILD_INTERVAL') or 10 * 60)
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 5000)
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL') or 24 * 60 * 60)
+    IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR') or os.path.join(basedir, 'cache', 'images')
+    IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES') or 512 * 1024 * 1024)
+    IMAGE_THUMBNAIL_WIDTH = int(os.environ.get('IMAGE_THUMBNAIL_WIDTH') or 280)
+    IMAGE_MAX_AGE = int(os.environ.get('IMAGE_MAX_AGE') or 365 * 24 * 60 * 60)
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'false').lower() == 'true'
+    PROFILE_SLOW_REQUESTS = float(os.environ.get('PROFILE_SLOW_REQUESTS') or 0)
+    PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL') or 0.005)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(basedir, 'cache', 'profiles')
+    TRACKERS_PER_PAGE = 10
+    TRACKERS_PAGINATION = os.environ.get('TRACKERS_PAGINATION') or 'cursor'
+    API_MAX_BATCH = 500
\ No newline at end of file
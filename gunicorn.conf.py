@@ -0,0 +1,44 @@
+'''Gunicorn settings for serving Anime Tracker, used by boot.sh. Searches spend most
+of their time waiting on MyAnimeList, so each worker process serves many requests at
+once, with threads (gthread, the default) or greenlets (gevent):
+
+    GUNICORN_WORKER_CLASS  gthread, gevent or sync
+    GUNICORN_WORKERS       worker processes, derived from the number of cores by default
+    GUNICORN_THREADS       threads per gthread worker
+    GUNICORN_CONNECTIONS   concurrent requests per gevent worker
+
+config.py sizes the database connection pool of each worker from the same variables.'''
+import multiprocessing
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'gthread'
+if worker_class == 'gevent':
+    # Patch before the app is preloaded, or its sockets and locks would not cooperate
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.environ.get('GUNICORN_BIND') or ':5000'
+# A gevent worker keeps a core busy on its own, while threaded and sync workers also
+# wait on the GIL and on I/O
+cores = multiprocessing.cpu_count()
+workers = int(os.environ.get('GUNICORN_WORKERS') or (cores if worker_class == 'gevent' else 2 * cores + 1))
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+worker_connections = int(os.environ.get('GUNICORN_CONNECTIONS') or 100)
+# Load the app once in the master so that workers fork with it already imported
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound the growth of the in-memory caches
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    '''Drops any database connection inherited from the master, which must not be shared.'''
+    from app import db
+    from animetracker import app
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,44 @@
+"""Add per-user tracker statistics
+
+Revision ID: 3b7e0d2f6a58
+Revises: f58b2c0d9e41
+Create Date: 2026-10-18 15:58:27.604139
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e0d2f6a58'
+down_revision = 'f58b2c0d9e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('watching', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('holding', sa.Integer(), nullable=False),
+    sa.Column('dropped', sa.Integer(), nullable=False),
+    sa.Column('planning', sa.Integer(), nullable=False),
+    sa.Column('episodes_watched', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Backfill from the existing trackers
+    op.execute("INSERT INTO user_stats (user_id, watching, completed, holding, dropped, planning, "
+        "episodes_watched) SELECT user_id, "
+        "COUNT(CASE WHEN status = 'Watching' THEN 1 END), "
+        "COUNT(CASE WHEN status = 'Completed' THEN 1 END), "
+        "COUNT(CASE WHEN status = 'Holding' THEN 1 END), "
+        "COUNT(CASE WHEN status = 'Dropped' THEN 1 END), "
+        "COUNT(CASE WHEN status = 'Planning' THEN 1 END), "
+        "COALESCE(SUM(watched_episodes), 0) "
+        "FROM tracker WHERE user_id IS NOT NULL GROUP BY user_id")
+
+
+def downgrade():
+    op.drop_table('user_stats')
@@ -0,0 +1,32 @@
+"""Key anime by MyAnimeList id
+
+Revision ID: 5b1f0c9e7a2d
+Revises: 24d224665341
+Create Date: 2026-10-18 10:12:41.503216
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1f0c9e7a2d'
+down_revision = '24d224665341'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('anime', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('mal_id', sa.Integer(), nullable=True))
+        batch_op.drop_index('ix_anime_title')
+        batch_op.create_index(batch_op.f('ix_anime_title'), ['title'], unique=False)
+        batch_op.create_index(batch_op.f('ix_anime_mal_id'), ['mal_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('anime', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_anime_mal_id'))
+        batch_op.drop_index(batch_op.f('ix_anime_title'))
+        batch_op.create_index('ix_anime_title', ['title'], unique=True)
+        batch_op.drop_column('mal_id')
@@ -0,0 +1,36 @@
+"""Order tracker list indexes by id descending
+
+Revision ID: 6e4f1a9c2b70
+Revises: 3b7e0d2f6a58
+Create Date: 2026-10-18 17:42:09.318265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e4f1a9c2b70'
+down_revision = '3b7e0d2f6a58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lists are ordered by timestamp DESC, id DESC, so the id has to descend as well for
+    # the pages to be read from the index without a sort
+    op.drop_index('ix_tracker_user_id_status_timestamp', table_name='tracker')
+    op.drop_index('ix_tracker_user_id_timestamp', table_name='tracker')
+    op.create_index('ix_tracker_user_id_status_timestamp', 'tracker',
+        ['user_id', 'status', sa.text('timestamp DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_tracker_user_id_timestamp', 'tracker',
+        ['user_id', sa.text('timestamp DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tracker_user_id_timestamp', table_name='tracker')
+    op.drop_index('ix_tracker_user_id_status_timestamp', table_name='tracker')
+    op.create_index('ix_tracker_user_id_timestamp', 'tracker',
+        ['user_id', sa.text('timestamp DESC'), 'id'], unique=False)
+    op.create_index('ix_tracker_user_id_status_timestamp', 'tracker',
+        ['user_id', 'status', sa.text('timestamp DESC'), 'id'], unique=False)
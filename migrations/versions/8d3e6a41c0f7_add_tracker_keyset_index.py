@@ -0,0 +1,25 @@
+"""Add tracker keyset index
+
+Revision ID: 8d3e6a41c0f7
+Revises: 5b1f0c9e7a2d
+Create Date: 2026-10-18 11:02:17.884350
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3e6a41c0f7'
+down_revision = '5b1f0c9e7a2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_tracker_user_id_status_timestamp', 'tracker',
+        ['user_id', 'status', sa.text('timestamp DESC'), 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tracker_user_id_status_timestamp', table_name='tracker')
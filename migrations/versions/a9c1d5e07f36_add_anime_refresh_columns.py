@@ -0,0 +1,30 @@
+"""Add anime airing status and last fetched time
+
+Revision ID: a9c1d5e07f36
+Revises: e2a6f3d81b94
+Create Date: 2026-10-18 14:40:09.318725
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c1d5e07f36'
+down_revision = 'e2a6f3d81b94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('anime', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('airing_status', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('last_fetched_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_anime_last_fetched_at'), ['last_fetched_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('anime', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_anime_last_fetched_at'))
+        batch_op.drop_column('last_fetched_at')
+        batch_op.drop_column('airing_status')
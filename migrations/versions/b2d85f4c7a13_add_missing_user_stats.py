@@ -0,0 +1,35 @@
+"""Add statistics for users without trackers
+
+Revision ID: b2d85f4c7a13
+Revises: 6e4f1a9c2b70
+Create Date: 2026-10-18 18:21:44.502917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d85f4c7a13'
+down_revision = '6e4f1a9c2b70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The backfill only covered users with trackers at the time, so summarize the others
+    op.execute('INSERT INTO user_stats (user_id, watching, completed, holding, dropped, planning, '
+        'episodes_watched) SELECT "user".id, '
+        "COUNT(CASE WHEN tracker.status = 'Watching' THEN 1 END), "
+        "COUNT(CASE WHEN tracker.status = 'Completed' THEN 1 END), "
+        "COUNT(CASE WHEN tracker.status = 'Holding' THEN 1 END), "
+        "COUNT(CASE WHEN tracker.status = 'Dropped' THEN 1 END), "
+        "COUNT(CASE WHEN tracker.status = 'Planning' THEN 1 END), "
+        'COALESCE(SUM(tracker.watched_episodes), 0) '
+        'FROM "user" LEFT OUTER JOIN tracker ON tracker.user_id = "user".id '
+        'WHERE "user".id NOT IN (SELECT user_id FROM user_stats) GROUP BY "user".id')
+
+
+def downgrade():
+    # Empty summaries are correct for the earlier revisions as well
+    pass
@@ -0,0 +1,32 @@
+"""Add tracker indexes and unique user/anime pair
+
+Revision ID: c47a9e2b5d18
+Revises: 8d3e6a41c0f7
+Create Date: 2026-10-18 11:48:05.127904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47a9e2b5d18'
+down_revision = '8d3e6a41c0f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep only the oldest tracker of any duplicated user/anime pair
+    op.execute('DELETE FROM tracker WHERE id NOT IN '
+        '(SELECT MIN(id) FROM tracker GROUP BY user_id, anime_id)')
+    op.create_index('ix_tracker_user_id_anime_id', 'tracker', ['user_id', 'anime_id'], unique=True)
+    op.create_index('ix_tracker_user_id_timestamp', 'tracker',
+        ['user_id', sa.text('timestamp DESC'), 'id'], unique=False)
+    op.create_index('ix_tracker_anime_id', 'tracker', ['anime_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tracker_anime_id', table_name='tracker')
+    op.drop_index('ix_tracker_user_id_timestamp', table_name='tracker')
+    op.drop_index('ix_tracker_user_id_anime_id', table_name='tracker')
@@ -0,0 +1,50 @@
+"""Add anime title search index
+
+Revision ID: f58b2c0d9e41
+Revises: a9c1d5e07f36
+Create Date: 2026-10-18 15:21:44.072583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f58b2c0d9e41'
+down_revision = 'a9c1d5e07f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE anime_fts USING fts5(title, content='anime', "
+            "content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+        op.execute("CREATE VIRTUAL TABLE anime_fts_vocab USING fts5vocab(anime_fts, 'row')")
+        op.execute('CREATE TRIGGER anime_fts_insert AFTER INSERT ON anime BEGIN '
+            'INSERT INTO anime_fts (rowid, title) VALUES (new.id, new.title); END')
+        op.execute('CREATE TRIGGER anime_fts_delete AFTER DELETE ON anime BEGIN '
+            "INSERT INTO anime_fts (anime_fts, rowid, title) VALUES ('delete', old.id, old.title); END")
+        op.execute('CREATE TRIGGER anime_fts_update AFTER UPDATE OF title ON anime BEGIN '
+            "INSERT INTO anime_fts (anime_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+            'INSERT INTO anime_fts (rowid, title) VALUES (new.id, new.title); END')
+        op.execute("INSERT INTO anime_fts (anime_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute("CREATE INDEX ix_anime_title_tsvector ON anime "
+            "USING gin (to_tsvector('simple', title))")
+        op.execute('CREATE INDEX ix_anime_title_trgm ON anime USING gin (title gin_trgm_ops)')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TRIGGER anime_fts_update')
+        op.execute('DROP TRIGGER anime_fts_delete')
+        op.execute('DROP TRIGGER anime_fts_insert')
+        op.execute('DROP TABLE anime_fts_vocab')
+        op.execute('DROP TABLE anime_fts')
+    elif dialect == 'postgresql':
+        op.drop_index('ix_anime_title_trgm', table_name='anime')
+        op.drop_index('ix_anime_title_tsvector', table_name='anime')
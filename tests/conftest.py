@@ -0,0 +1,82 @@
+import pytest
+
+from app import create_app, db
+from app.models import Anime, Tracker, User, UserStats
+from config import Config
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    WTF_CSRF_ENABLED = False
+    MAL_BASE_URL = 'http://127.0.0.1:9'
+    MAL_ENRICH_ASYNC = False
+    INSTRUMENTATION_ENABLED = False
+
+
+@pytest.fixture
+def app():
+    '''The app with an empty in-memory database. No app context is left pushed, so
+    that every request gets a session of its own as it would when deployed.'''
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    '''Returns the id of a registered user.'''
+    with app.app_context():
+        user = User(username='susan', email='susan@example.com')
+        user.set_password('cat')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, user):
+    '''A test client logged in as the user.'''
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'susan', 'password': 'cat'})
+    return client
+
+
+@pytest.fixture
+def queries(app):
+    '''Counts the statements sent to the database, reset with queries.clear().'''
+    statements = []
+
+    def count(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', count)
+
+
+@pytest.fixture
+def add_trackers(app):
+    '''Adds trackers of new animes for a user, a minute apart, and updates their
+    statistics.'''
+    def add_trackers(user_id, count, status='Watching'):
+        with app.app_context():
+            start = Anime.query.count()
+            for n in range(start, start + count):
+                anime = Anime(mal_id=n, title=f'Anime {n}', total_episodes=12)
+                db.session.add(anime)
+                db.session.add(Tracker(user_id=user_id, anime=anime, status=status,
+                    timestamp=datetime(2022, 1, 1) + timedelta(minutes=n)))
+            db.session.flush()
+            UserStats.rebuild(user_id)
+            db.session.commit()
+
+    return add_trackers
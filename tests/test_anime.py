@@ -0,0 +1,41 @@
+from app import db
+from app.models import Anime
+
+
+def row(mal_id, complete=True, **values):
+    return dict({'mal_id': mal_id, 'title': f'Anime {mal_id}', 'image_url': f'{mal_id}.jpg',
+        'total_episodes': 12, 'complete': complete}, **values)
+
+
+def test_upsert_many_fills_in_incomplete_animes(app):
+    with app.app_context():
+        Anime.upsert_many([row(1, complete=False, image_url='', total_episodes=0), row(2)])
+        db.session.commit()
+        animes = Anime.upsert_many([row(1), row(2, title='Renamed', total_episodes=24)])
+        db.session.commit()
+        assert [(anime.title, anime.image_url, anime.total_episodes) for anime in animes] == \
+            [('Anime 1', '1.jpg', 12), ('Anime 2', '2.jpg', 12)]
+        assert all(anime.last_fetched_at is not None for anime in Anime.query)
+
+
+def test_upsert_many_leaves_committing_to_the_caller(app):
+    with app.app_context():
+        assert [anime.mal_id for anime in Anime.upsert_many([row(2), row(1)])] == [2, 1]
+        db.session.rollback()
+        assert Anime.query.count() == 0
+
+
+def test_image_requires_login(app, client):
+    with app.app_context():
+        anime = Anime(mal_id=1, title='Anime 1', image_url='http://127.0.0.1:9/1.jpg',
+            total_episodes=12)
+        db.session.add(anime)
+        db.session.commit()
+        anime_id = anime.id
+    response = app.test_client().get(f'/img/{anime_id}')
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
+    # The image cannot be fetched, so the logged in user is sent to the original
+    response = client.get(f'/img/{anime_id}')
+    assert response.status_code == 302
+    assert response.headers['Location'] == 'http://127.0.0.1:9/1.jpg'
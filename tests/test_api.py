@@ -0,0 +1,76 @@
+import pytest
+
+from app.models import Tracker, UserStats
+
+
+@pytest.mark.parametrize('per_page, expected', [(-5, 1), (0, 1), (3, 3), (1000, 12)])
+def test_get_trackers_clamps_per_page(client, user, add_trackers, per_page, expected):
+    add_trackers(user, 12)
+    response = client.get('/api/v1/trackers', query_string={'per_page': per_page})
+    assert response.status_code == 200
+    assert len(response.json['items']) == expected
+
+
+@pytest.fixture
+def tracker_ids(app, user, add_trackers):
+    '''Adds 3 trackers of 12-episode animes and returns their ids.'''
+    add_trackers(user, 3)
+    with app.app_context():
+        return [tracker.id for tracker in Tracker.query.order_by(Tracker.id)]
+
+
+def stored(app):
+    with app.app_context():
+        return {tracker.id: (tracker.status, tracker.watched_episodes) for tracker in Tracker.query}
+
+
+def test_update_trackers_applies_the_batch(app, client, user, tracker_ids):
+    response = client.patch('/api/v1/trackers', json={'updates': [
+        {'tracker_id': tracker_ids[0], 'watched_episodes': 12, 'status': 'Completed'},
+        {'tracker_id': tracker_ids[1], 'watched_episodes': 3}]})
+    assert response.status_code == 200
+    assert [item['id'] for item in response.json['items']] == tracker_ids[:2]
+    assert stored(app) == {tracker_ids[0]: ('Completed', 12), tracker_ids[1]: ('Watching', 3),
+        tracker_ids[2]: ('Watching', 0)}
+    with app.app_context():
+        assert UserStats.for_user(user).to_dict()['counts']['Completed'] == 1
+
+
+@pytest.mark.parametrize('update, error', [
+    ({'watched_episodes': -1}, 'Watched episodes cannot be negative.'),
+    ({'watched_episodes': 13}, 'Watched episodes cannot exceed 12.'),
+    ({'watched_episodes': '3'}, 'Watched episodes must be an integer.'),
+    ({'status': 'Rewatching'}, 'Status must be one of'),
+])
+def test_update_trackers_applies_nothing_if_an_update_is_invalid(app, client, tracker_ids,
+        update, error):
+    before = stored(app)
+    response = client.patch('/api/v1/trackers', json=[
+        {'tracker_id': tracker_ids[0], 'watched_episodes': 5},
+        dict(update, tracker_id=tracker_ids[1])])
+    assert response.status_code == 400
+    assert list(response.json['errors']) == [str(tracker_ids[1])]
+    assert response.json['errors'][str(tracker_ids[1])].startswith(error)
+    assert stored(app) == before
+
+
+@pytest.mark.parametrize('updates', [[], {}, [{'watched_episodes': 1}], [{'tracker_id': '1'}],
+    [{'tracker_id': True}], [{'tracker_id': False, 'watched_episodes': 1}]])
+def test_update_trackers_requires_integer_tracker_ids(client, tracker_ids, updates):
+    assert client.patch('/api/v1/trackers', json=updates).status_code == 400
+
+
+def test_update_trackers_rejects_unknown_trackers(client, tracker_ids):
+    response = client.patch('/api/v1/trackers', json=[{'tracker_id': max(tracker_ids) + 1}])
+    assert response.status_code == 400
+    assert response.json['errors'] == {str(max(tracker_ids) + 1): 'Tracker not found.'}
+
+
+def test_update_trackers_limits_the_batch_size(app, client, tracker_ids):
+    app.config['API_MAX_BATCH'] = 2
+    before = stored(app)
+    response = client.patch('/api/v1/trackers', json=[{'tracker_id': id, 'watched_episodes': 1}
+        for id in tracker_ids])
+    assert response.status_code == 400
+    assert response.json['message'] == 'At most 2 updates are allowed.'
+    assert stored(app) == before
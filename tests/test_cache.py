@@ -0,0 +1,44 @@
+import os
+import pytest
+
+from app.cache import MemoryCache, NullCache, SQLiteCache
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCache(2)
+    return SQLiteCache(2, os.path.join(tmp_path, 'cache.db'))
+
+
+def test_stats_count_hits_misses_and_evictions(cache):
+    cache.set('a', 1, 60)
+    cache.set('b', 2, 60)
+    assert cache.get('a') == 1
+    # Evicts b, the least recently used entry
+    cache.set('c', 3, 60)
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'evictions': 1}
+
+
+def test_stats_count_expired_entries_as_misses(cache):
+    cache.set('a', 1, -1)
+    assert cache.get('a') is None
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'evictions': 0}
+
+
+def test_null_cache_only_misses():
+    cache = NullCache(10)
+    cache.set('a', 1, 60)
+    assert cache.get('a') is None
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'evictions': 0}
+
+
+def test_contains_does_not_count_as_a_lookup(cache):
+    cache.set('a', 1, 60)
+    cache.set('b', 2, -1)
+    assert cache.contains('a')
+    assert not cache.contains('b')
+    assert not cache.contains('c')
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'evictions': 0}
@@ -0,0 +1,15 @@
+def index_queries(client, queries, **params):
+    queries.clear()
+    response = client.get('/index', query_string=params)
+    assert response.status_code == 200
+    return len(queries)
+
+
+def test_index_queries_do_not_grow_with_trackers(app, client, user, queries, add_trackers):
+    for count in (1, 9):
+        add_trackers(user, count)
+        app.extensions['user_cache'].delete(str(user))
+        # The first request loads the user and the statistics before the page of trackers
+        assert index_queries(client, queries) == 3
+        # The user is cached from then on
+        assert index_queries(client, queries, status='Watching') == 2
@@ -0,0 +1,57 @@
+import pytest
+
+from app import create_app, db
+from tests.conftest import TestConfig
+
+
+class InstrumentedConfig(TestConfig):
+    INSTRUMENTATION_ENABLED = True
+
+
+@pytest.fixture
+def instrumented():
+    app = create_app(InstrumentedConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def metrics(instrumented):
+    '''Returns a function getting the lines of /metrics from an instrumented app.'''
+    client = instrumented.test_client()
+
+    def metrics():
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        return response.get_data(as_text=True).splitlines()
+
+    return metrics
+
+
+def samples(lines):
+    return dict(line.rsplit(' ', 1) for line in lines if not line.startswith('#'))
+
+
+def test_metrics_export_mal_search_counters(metrics):
+    # The client is shared by every app, so only the presence of the series is checked
+    exported = samples(metrics())
+    for name in ('animetracker_mal_searches_total', 'animetracker_mal_coalesced_searches_total',
+            'animetracker_mal_search_upstream_calls_total'):
+        assert int(exported[name]) >= 0
+    assert sum(int(exported[f'animetracker_mal_breaker_state{{state="{state}"}}'])
+        for state in ('closed', 'half-open', 'open')) == 1
+
+
+def test_metrics_export_cache_stats(instrumented, metrics):
+    cache = instrumented.extensions['user_cache']
+    cache.set('1', 'susan', 60)
+    cache.get('1')
+    cache.get('2')
+    exported = samples(metrics())
+    assert exported['animetracker_cache_hits_total{cache="user"}'] == '1'
+    assert exported['animetracker_cache_misses_total{cache="user"}'] == '1'
+    assert exported['animetracker_cache_evictions_total{cache="user"}'] == '0'
+    for name in ('mal', 'fragment'):
+        for key in ('hits', 'misses', 'evictions'):
+            assert int(exported[f'animetracker_cache_{key}_total{{cache="{name}"}}']) >= 0
@@ -0,0 +1,104 @@
+import pytest
+
+from app import db
+from app.jobs import claim, enqueue, job, requeue_stale, run, work
+from app.models import Job
+from datetime import datetime, timedelta
+
+calls = []
+
+
+@job('test_succeed')
+def succeed(value):
+    calls.append(value)
+
+
+@job('test_fail')
+def fail():
+    calls.append('fail')
+    raise RuntimeError('upstream is down')
+
+
+@pytest.fixture
+def context(app):
+    app.config.update(JOB_MAX_ATTEMPTS=3, JOB_BACKOFF=10)
+    calls.clear()
+    with app.app_context():
+        yield
+
+
+def add(name, **payload):
+    job = enqueue(name, **payload)
+    db.session.commit()
+    return job.id
+
+
+def make_due(job_id):
+    Job.query.filter_by(id=job_id).update({'run_at': datetime.utcnow()})
+    db.session.commit()
+
+
+def test_work_runs_and_deletes_succeeded_jobs(context):
+    add('test_succeed', value=1)
+    add('test_succeed', value=2)
+    work(once=True)
+    assert calls == [1, 2]
+    assert Job.query.filter(Job.name.like('test_%')).count() == 0
+
+
+def test_claim_takes_each_due_job_once(context):
+    job_id = add('test_succeed', value=1)
+    enqueue('test_succeed', delay=60, value=2)
+    db.session.commit()
+    claimed = claim()
+    assert (claimed.id, claimed.status, claimed.attempts) == (job_id, 'running', 1)
+    assert claim() is None
+
+
+def test_failed_jobs_are_retried_with_backoff(context):
+    job_id = add('test_fail')
+    start = datetime.utcnow()
+    work(once=True)
+    failed = Job.query.get(job_id)
+    assert (failed.status, failed.attempts) == ('queued', 1)
+    assert 'RuntimeError: upstream is down' in failed.last_error
+    assert start + timedelta(seconds=10) <= failed.run_at <= datetime.utcnow() + timedelta(seconds=15)
+    # Not due again yet
+    work(once=True)
+    assert calls == ['fail']
+    make_due(job_id)
+    start = datetime.utcnow()
+    work(once=True)
+    failed = Job.query.get(job_id)
+    assert (failed.status, failed.attempts) == ('queued', 2)
+    assert start + timedelta(seconds=20) <= failed.run_at <= datetime.utcnow() + timedelta(seconds=30)
+
+
+def test_jobs_fail_for_good_after_max_attempts(context):
+    job_id = add('test_fail')
+    for _ in range(3):
+        make_due(job_id)
+        run(claim())
+    failed = Job.query.get(job_id)
+    assert (failed.status, failed.attempts) == ('failed', 3)
+    make_due(job_id)
+    assert claim() is None
+    assert calls == ['fail'] * 3
+
+
+def test_jobs_without_a_handler_fail(context):
+    job_id = add('test_unknown')
+    run(claim())
+    assert 'LookupError: No handler for job test_unknown' in Job.query.get(job_id).last_error
+
+
+def test_requeue_stale_puts_back_abandoned_jobs(context, app):
+    job_id = add('test_succeed', value=1)
+    claim()
+    requeue_stale()
+    assert Job.query.get(job_id).status == 'running'
+    Job.query.filter_by(id=job_id).update(
+        {'locked_at': datetime.utcnow() - timedelta(seconds=app.config['JOB_TIMEOUT'] + 1)})
+    db.session.commit()
+    requeue_stale()
+    assert Job.query.get(job_id).status == 'queued'
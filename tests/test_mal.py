@@ -0,0 +1,59 @@
+import pytest
+import time
+
+from app import create_app
+from app.mal import MALClient
+from benchmarks.stub_mal import serve
+from tests.conftest import TestConfig
+
+
+@pytest.fixture
+def server():
+    server = serve()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_client(server):
+    '''Returns a function making a client of the stub server with the given settings.'''
+    def make_client(**config):
+        class MALConfig(TestConfig):
+            MAL_BASE_URL = server.base_url
+            MAL_ENRICH_ASYNC = True
+            MAL_RATE_BURST = 100
+            MAL_BREAKER_THRESHOLD = 100
+            MAL_RETRY_BACKOFF = 0.01
+        for key, value in config.items():
+            setattr(MALConfig, key, value)
+        return MALClient(create_app(MALConfig))
+
+    return make_client
+
+
+def test_search_retries_server_errors(server, make_client):
+    client = make_client(MAL_RETRIES=2)
+    server.error_rate = 1.0
+    assert client.search('naruto', 0) is None
+    assert server.requests == 3
+    server.error_rate = 0.0
+    assert len(client.search('naruto', 0)['animes']) == 10
+
+
+def test_search_stops_retrying_at_the_deadline(server, make_client):
+    client = make_client(MAL_RETRIES=10, MAL_RETRY_BACKOFF=0.2, MAL_SEARCH_DEADLINE=0.5)
+    server.error_rate = 1.0
+    start = time.monotonic()
+    assert client.search('naruto', 0) is None
+    assert time.monotonic() - start < 0.5
+    # Attempts after 0, 0.2 and 0.6 seconds, the last of which would miss the deadline
+    assert server.requests == 2
+
+
+def test_slow_search_is_cut_short_at_the_deadline(server, make_client):
+    client = make_client(MAL_SEARCH_DEADLINE=0.3)
+    server.latency = 1.0
+    start = time.monotonic()
+    assert client.search('naruto', 0) is None
+    assert time.monotonic() - start < 0.6
@@ -0,0 +1,64 @@
+import base64
+import json
+import pytest
+
+from app import db
+from app.models import Anime, Tracker
+from app.pagination import decode_cursor, encode_cursor, paginate_keyset
+from datetime import datetime
+
+
+def cursor(payload):
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def test_cursor_round_trip():
+    key = (datetime(2022, 5, 1, 12, 30, 15, 250), 42)
+    assert decode_cursor(encode_cursor(key, 'next')) == (key, 'next')
+    assert decode_cursor(encode_cursor(key, 'prev')) == (key, 'prev')
+
+
+@pytest.mark.parametrize('value', ['garbage', '!!!', cursor('[1, 2]'), cursor('{}'),
+    cursor('["2022-01-01T00:00:00", 1, "sideways"]'), cursor('["yesterday", 1, "next"]'),
+    cursor('[0, 1, "next"]'), cursor(json.dumps(['2022-01-01T00:00:00', 2 ** 70, 'next']))])
+def test_decode_cursor_rejects_malformed_cursors(value):
+    assert decode_cursor(value) is None
+
+
+@pytest.fixture
+def trackers(app, user):
+    '''Adds 10 trackers for the user whose timestamps tie in pairs, and returns their ids
+    in list order.'''
+    with app.app_context():
+        for n in range(10):
+            anime = Anime(mal_id=n, title=f'Anime {n}', total_episodes=12)
+            db.session.add(Tracker(user_id=user, anime=anime, timestamp=datetime(2022, 1, 1, n // 2)))
+        db.session.commit()
+        return [tracker.id for tracker in
+            Tracker.query.order_by(Tracker.timestamp.desc(), Tracker.id.desc())]
+
+
+def test_keyset_pages_forward_and_back_through_ties(app, trackers):
+    columns = (Tracker.timestamp, Tracker.id)
+    with app.app_context():
+        pages, cursor = [], None
+        while True:
+            page = paginate_keyset(Tracker.query, columns, cursor, 3)
+            pages.append([tracker.id for tracker in page.items])
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        assert pages == [trackers[0:3], trackers[3:6], trackers[6:9], trackers[9:]]
+        assert not paginate_keyset(Tracker.query, columns, None, 3).has_prev
+        back = []
+        while page.has_prev:
+            page = paginate_keyset(Tracker.query, columns, page.prev_cursor, 3)
+            back.append([tracker.id for tracker in page.items])
+        assert back == pages[-2::-1]
+
+
+@pytest.mark.parametrize('url', ['/index', '/api/v1/trackers'])
+def test_malformed_cursor_is_a_bad_request(client, trackers, url):
+    assert client.get(url, query_string={'cursor': 'garbage'}).status_code == 400
+    overflow = cursor(json.dumps(['2022-01-01T00:00:00', 2 ** 70, 'next']))
+    assert client.get(url, query_string={'cursor': overflow}).status_code == 400
@@ -0,0 +1,34 @@
+from app.ratelimit import MemoryLimiter, SearchLimiter
+
+
+def make_limiter(user_burst, global_burst):
+    limiter = SearchLimiter()
+    limiter.user = MemoryLimiter(0.001, user_burst)
+    limiter.everyone = MemoryLimiter(0.001, global_burst)
+    return limiter
+
+
+def test_user_limit_stops_a_user():
+    limiter = make_limiter(2, 10)
+    assert [limiter.hit(1) == 0 for _ in range(3)] == [True, True, False]
+    assert limiter.hit(2) == 0
+
+
+def test_global_denial_does_not_cost_the_user_a_token():
+    limiter = make_limiter(2, 3)
+    assert [limiter.hit(1) == 0 for _ in range(2)] == [True, True]
+    assert limiter.hit(2) == 0
+    # The global bucket is empty now, so the next searches are turned down by it
+    assert [limiter.hit(2) > 0 for _ in range(5)] == [True] * 5
+    # Once the global bucket has room again, user 2 still has a token left
+    limiter.everyone = MemoryLimiter(0.001, 10)
+    assert [limiter.hit(2) == 0 for _ in range(2)] == [True, False]
+
+
+def test_refund_never_overfills_a_bucket():
+    limiter = MemoryLimiter(0.001, 2)
+    limiter.refund('a')
+    limiter.hit('a')
+    limiter.refund('a')
+    limiter.refund('a')
+    assert [limiter.hit('a') == 0 for _ in range(3)] == [True, True, False]
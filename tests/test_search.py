@@ -0,0 +1,64 @@
+import os
+import pytest
+import re
+
+from app import db, mal, search_limiter
+from app.models import Anime
+from app.ratelimit import MemoryLimiter
+from flask_migrate import upgrade
+
+
+def test_local_searches_are_not_rate_limited(app, client, user, add_trackers):
+    add_trackers(user, 3)
+    burst = app.config['SEARCH_USER_BURST']
+    for _ in range(burst + 5):
+        response = client.get('/search', query_string={'q': 'anime'})
+        assert response.status_code == 200
+        assert b'Anime 1' in response.data
+
+
+def test_cached_mal_pages_are_not_rate_limited(app, client):
+    page = {'animes': [{'mal_id': 1, 'title': 'Naruto', 'image_url': '', 'total_episodes': 220,
+        'airing_status': 'finished_airing', 'complete': True}], 'paging': {}}
+    mal.cache.set(mal._key('naruto', 0), page, 60)
+    burst = 3
+    # Failing searches are slow to retry, so the bucket must not refill meanwhile
+    search_limiter.user = MemoryLimiter(0.001, burst)
+    for _ in range(burst + 5):
+        response = client.get('/search', query_string={'q': 'naruto', 'source': 'mal'})
+        assert response.status_code == 200
+        assert b'Naruto' in response.data
+    # Uncached searches use up the burst, and fail since MyAnimeList is unreachable
+    for n in range(burst):
+        response = client.get('/search', query_string={'q': f'bleach {n}', 'source': 'mal'})
+        assert response.status_code == 302
+    response = client.get('/search', query_string={'q': 'bleach', 'source': 'mal'})
+    assert response.status_code == 429
+
+
+@pytest.fixture
+def catalog(app):
+    '''Migrates the database, which creates the full-text index, and adds 15 animes.'''
+    with app.app_context():
+        db.drop_all()
+        upgrade(directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+        db.session.add_all([Anime(mal_id=n, title=f'Naruto part {n}', total_episodes=12)
+            for n in range(1, 16)])
+        db.session.commit()
+
+
+def titles(response):
+    return re.findall(r'Naruto part \d+', response.get_data(as_text=True))
+
+
+@pytest.mark.parametrize('q', ['naruto', 'narutp'])
+def test_local_search_pages_stay_local(app, catalog, client, q):
+    mal_searches = mal.searches
+    first = client.get('/search', query_string={'q': q})
+    second = client.get('/search', query_string={'q': q, 'offset': 10, 'source': 'local'})
+    third = client.get('/search', query_string={'q': q, 'offset': 20, 'source': 'local'})
+    assert [response.status_code for response in (first, second, third)] == [200, 200, 200]
+    assert len(set(titles(first))) == 10 and len(set(titles(second))) == 5
+    assert set(titles(first)).isdisjoint(titles(second))
+    assert titles(third) == []
+    assert mal.searches == mal_searches
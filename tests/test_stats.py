@@ -0,0 +1,45 @@
+import pytest
+
+from app import db
+from app.models import Anime, Tracker, User, UserStats
+
+
+def progress(watched_episodes, status):
+    return {'watched_episodes': watched_episodes, 'status': status,
+            'start_date': '2022-01-01', 'end_date': '2022-01-02'}
+
+
+def check_stats(app, user_id):
+    with app.app_context():
+        stats = UserStats.for_user(user_id)
+        aggregate = UserStats.aggregate().filter(User.id == user_id).one()
+        assert (stats.user_id, *[getattr(stats, column) for column in UserStats.COLUMNS]) \
+            == tuple(aggregate)
+
+
+@pytest.mark.parametrize('summary', [True, False])
+def test_stats_follow_tracker_changes(app, client, user, summary):
+    with app.app_context():
+        if summary:
+            db.session.add(UserStats.empty(user))
+        animes = [Anime(mal_id=n, title=f'Anime {n}', image_url='', total_episodes=12)
+                  for n in range(3)]
+        db.session.add_all(animes)
+        db.session.commit()
+        anime_ids = [anime.id for anime in animes]
+    for n, anime_id in enumerate(anime_ids):
+        response = client.post(f'/{anime_id}/track', data=progress(n, 'Watching'))
+        assert response.status_code == 302
+        check_stats(app, user)
+    with app.app_context():
+        tracker_ids = [tracker.id for tracker in Tracker.query.order_by(Tracker.id)]
+    for tracker_id, changes in zip(tracker_ids, [(12, 'Completed'), (5, 'Dropped')]):
+        response = client.post(f'/tracker/{tracker_id}/edit', data=progress(*changes))
+        assert response.status_code == 302
+        check_stats(app, user)
+    for tracker_id in tracker_ids[:2]:
+        assert client.post(f'/tracker/{tracker_id}/delete').status_code == 302
+        check_stats(app, user)
+    with app.app_context():
+        stats = UserStats.for_user(user)
+        assert (stats.total, stats.watching, stats.episodes_watched) == (1, 1, 2)
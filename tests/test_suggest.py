@@ -0,0 +1,64 @@
+import threading
+
+from app import db
+from app.models import Anime
+from app.suggest import TitleIndex
+
+
+class SlowIndex(TitleIndex):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+
+    def build(self):
+        self.release.wait(5)
+        super().build()
+
+
+def add_titles(app, *titles):
+    with app.app_context():
+        db.session.add_all([Anime(title=title, image_url='', total_episodes=1)
+                            for title in titles])
+        db.session.commit()
+
+
+def test_first_build_does_not_block(app):
+    add_titles(app, 'Naruto', 'Naruto Shippuden', 'Bleach')
+    index = SlowIndex()
+    with app.app_context():
+        # Served from the empty index while the build waits
+        assert index.suggest('nar') == []
+        assert index.suggest('nar') == []
+        index.release.set()
+        index._thread.join(5)
+        assert index.suggest('nar') == ['Naruto', 'Naruto Shippuden']
+
+
+def test_stale_index_is_served_while_rebuilding(app):
+    add_titles(app, 'Naruto')
+    index = SlowIndex(rebuild_interval=0)
+    index.release.set()
+    with app.app_context():
+        index.refresh()
+        index._thread.join(5)
+        add_titles(app, 'Nana')
+        index.release.clear()
+        assert index.suggest('na') == ['Naruto']
+        index.release.set()
+        index._thread.join(5)
+        assert index.suggest('na') == ['Nana', 'Naruto']
+
+
+def test_failed_build_is_retried(app):
+    index = TitleIndex()
+    with app.app_context():
+        db.drop_all()
+        index.refresh()
+        index._thread.join(5)
+        assert index.built_at is None
+        db.create_all()
+    add_titles(app, 'Naruto')
+    with app.app_context():
+        index.refresh()
+        index._thread.join(5)
+        assert index.suggest('n') == ['Naruto']
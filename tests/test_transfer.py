@@ -0,0 +1,30 @@
+import io
+import json
+
+from app.models import Job, Tracker, UserStats
+from app.transfer import import_trackers, iter_csv
+
+CSV = '''mal_id,title,total_episodes,watched_episodes,start_date,end_date,status
+1,Cowboy Bebop,26,26,,,Completed
+2,Trigun,26,4,,,Watching
+3,Naruto,220,220,,,Completed
+4,Bleach,366,367,,,Watching
+5,Monster,74,0,,,Planning
+'''
+
+
+def test_import_trackers(app, user, queries):
+    app.config['CATALOG_REFRESH_BATCH'] = 3
+    with app.app_context():
+        queries.clear()
+        imported, skipped = import_trackers(user, iter_csv(io.BytesIO(CSV.encode())), chunk_size=2)
+        assert (imported, skipped) == (4, 1)
+        # The statistics are aggregated once rather than after every chunk
+        assert sum('count(CASE' in statement for statement in queries) == 1
+        stats = UserStats.for_user(user)
+        assert (stats.completed, stats.watching, stats.planning, stats.episodes_watched) == \
+            (2, 1, 1, 250)
+        assert Tracker.query.count() == 4
+        jobs = [json.loads(job.payload)['mal_ids'] for job in Job.query.filter_by(name='enrich_anime')]
+        assert sorted(id for ids in jobs for id in ids) == [1, 2, 3, 5]
+        assert all(len(ids) <= 3 for ids in jobs)